@@ -0,0 +1,83 @@
+import asyncio
+import atexit
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+# Отложенная запись сообщений чата. receive() только добавляет сообщение в буфер
+# процесса, в БД оно попадает bulk_create'ом в потоке (database_sync_to_async),
+# когда набралось CHAT_FLUSH_SIZE сообщений или прошло CHAT_FLUSH_INTERVAL секунд.
+# Записи идут строго по очереди и в порядке поступления, поэтому id (и crated_data)
+# внутри чата растут в том же порядке, в каком сообщения разосланы.
+# Сброс также при отключении клиента и при завершении процесса (atexit).
+
+CHAT_FLUSH_SIZE = getattr(settings, 'CHAT_FLUSH_SIZE', 100)
+CHAT_FLUSH_INTERVAL = getattr(settings, 'CHAT_FLUSH_INTERVAL', 1.0)
+
+
+def _write(batch):
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(batch)
+    except IntegrityError:
+        # Например, чат удалили, пока сообщения ждали в буфере — сохраняем остальные
+        for message in batch:
+            try:
+                with transaction.atomic():
+                    message.save(force_insert=True)
+            except IntegrityError as error:
+                logger.warning('Сообщение чата %s не сохранено: %s', message.chats_id, error)
+
+
+class MessageBuffer:
+
+    def __init__(self, max_size=CHAT_FLUSH_SIZE, max_delay=CHAT_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._pending = []
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._tasks = set()  # цикл событий держит на задачи только слабые ссылки
+
+    async def add(self, chat_id, author_id, text):
+        self._pending.append(Message(chats_id=chat_id, author_id=author_id, text=text))
+        if len(self._pending) >= self.max_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush_later)
+
+    def _flush_later(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Забираем буфер сразу: новые сообщения копятся в следующую пачку,
+        # а lock не даёт ей обогнать текущую запись
+        batch, self._pending = self._pending, []
+        async with self._lock:
+            if batch:
+                try:
+                    await database_sync_to_async(_write)(batch)
+                except Exception:
+                    logger.exception('Не удалось сохранить %s сообщений чата', len(batch))
+
+    def flush_sync(self):
+        # Завершение процесса: цикл событий уже остановлен, пишем напрямую
+        batch, self._pending = self._pending, []
+        if batch:
+            _write(batch)
+
+
+message_buffer = MessageBuffer()
+atexit.register(message_buffer.flush_sync)
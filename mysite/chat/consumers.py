@@ -1,11 +1,24 @@
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from .buffer import message_buffer
+from .history import chat_messages, is_member, older_page, page_size
+from .models import Chat
+from .serializers import MessageSerializer
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
+        self.room_name = self.scope["url_route"]["kwargs"]["chat_name"]
         self.room_group_name = f"chat_{self.room_name}"
+        # Писать и читать историю могут только участники существующего чата (вход — по JWT, chat.middleware)
+        user = self.scope.get("user")
+        self.author_id = user.pk if user is not None and user.is_authenticated else None
+        self.chat_id = await self.get_chat_id()
+        self.is_member = False
+        if self.chat_id is not None and self.author_id is not None:
+            self.is_member = await database_sync_to_async(is_member)(self.chat_id, self.author_id)
 
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
@@ -15,11 +28,46 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         # Leave room group
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        # История не должна ждать таймера после ухода клиента
+        await message_buffer.flush()
+
+    @database_sync_to_async
+    def get_chat_id(self):
+        return Chat.objects.filter(pk=self.room_name).values_list("pk", flat=True).first()
+
+    @database_sync_to_async
+    def get_older(self, cursor, limit):
+        messages, next_cursor = older_page(chat_messages(self.chat_id), cursor, limit)
+        return MessageSerializer(messages, many=True).data, next_cursor
+
+    async def load_older(self, data):
+        # {"action": "load_older", "cursor": <next из прошлого ответа или нет>, "limit": n}
+        if not self.is_member:
+            await self.send(text_data=json.dumps({"type": "error", "detail": "Вы не участник этого чата."}))
+            return
+        if not data.get("cursor"):
+            # Первая страница должна включать сообщения, ещё лежащие в буфере записи
+            await message_buffer.flush()
+        try:
+            messages, next_cursor = await self.get_older(data.get("cursor"), page_size(data.get("limit")))
+        except ValueError as error:
+            await self.send(text_data=json.dumps({"type": "error", "detail": str(error)}))
+            return
+        await self.send(text_data=json.dumps({"type": "history", "messages": messages, "next": next_cursor}))
 
     # Receive message from WebSocket
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
+        if text_data_json.get("action") == "load_older":
+            await self.load_older(text_data_json)
+            return
         message = text_data_json["message"]
+        if not self.is_member:
+            await self.send(text_data=json.dumps({"type": "error", "detail": "Вы не участник этого чата."}))
+            return
+
+        # Запись в БД — позже и пачкой (chat.buffer), рассылку не задерживает
+        await message_buffer.add(self.chat_id, self.author_id, message)
 
         # Send message to room group
         await self.channel_layer.group_send(
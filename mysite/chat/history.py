@@ -0,0 +1,100 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Chat, Message
+
+# История чата от новых к старым с keyset-пагинацией по паре (crated_data, id):
+# WHERE chats = ? AND (crated_data, id) < (курсор) ORDER BY crated_data DESC, id DESC LIMIT n.
+# Индекс chat_message_timeline (chats, crated_data, id) отдаёт страницу сразу с нужного
+# места, без OFFSET, — время не зависит от того, насколько далеко пролистали.
+# id в ключе различает сообщения с одинаковым crated_data (одна пачка chat.buffer).
+
+CHAT_HISTORY_PAGE_SIZE = getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50)
+CHAT_HISTORY_MAX_PAGE_SIZE = 100
+
+
+def is_member(chat_id, user_id):
+    return Chat.objects.filter(pk=chat_id, person=user_id).exists()
+
+
+def encode_cursor(message):
+    value = f'{message.crated_data.isoformat()}|{message.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(crated_data, id) из курсора; ValueError, если курсор испорчен."""
+    try:
+        created, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created), int(pk)
+    except (TypeError, UnicodeError, ValueError) as error:
+        raise ValueError('Неверный курсор') from error
+
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return CHAT_HISTORY_PAGE_SIZE
+    return min(max(size, 1), CHAT_HISTORY_MAX_PAGE_SIZE)
+
+
+def chat_messages(chat_id):
+    # Автор — тем же запросом (JOIN), только нужные поля
+    return (Message.objects
+            .filter(chats_id=chat_id)
+            .select_related('author')
+            .only('id', 'chats_id', 'text', 'image_chat', 'video_chat', 'crated_data',
+                  'author__id', 'author__username', 'author__avatar'))
+
+
+def older_page(queryset, cursor=None, limit=CHAT_HISTORY_PAGE_SIZE):
+    """Страница сообщений старше курсора (от новых к старым) и курсор следующей или None."""
+    if cursor:
+        created, pk = decode_cursor(cursor)
+        # crated_data__lte дублирует условие с OR, но даёт планировщику границу диапазона по индексу
+        queryset = queryset.filter(Q(crated_data__lt=created) | Q(crated_data=created, id__lt=pk),
+                                   crated_data__lte=created)
+    messages = list(queryset.order_by('-crated_data', '-id')[:limit + 1])
+    if len(messages) > limit:
+        messages = messages[:limit]
+        return messages, encode_cursor(messages[-1])
+    return messages, None
+
+
+class MessageKeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            page, self.next_cursor = older_page(queryset, request.query_params.get(self.cursor_query_param),
+                                                page_size(request.query_params.get(self.page_size_query_param)))
+        except ValueError as error:
+            raise NotFound(str(error))
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,50 @@
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from logo_app.authentication import StatelessJWTAuthentication
+
+# Аутентификация веб-сокетов тем же access-токеном, что и у API. Браузер не умеет
+# задавать заголовки для WebSocket, поэтому токен принимается и в ?token=<access>.
+# Без токена (или с неверным) scope["user"] остаётся от AuthMiddlewareStack — сессия или AnonymousUser.
+
+
+def raw_token(scope):
+    token = parse_qs(scope.get("query_string", b"").decode()).get("token")
+    if token:
+        return token[0].encode()
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            parts = value.split()
+            if len(parts) == 2 and parts[0].lower() == b"bearer":
+                return parts[1]
+    return None
+
+
+@database_sync_to_async
+def user_for_token(raw):
+    authentication = StatelessJWTAuthentication()
+    try:
+        # Для старых токенов без claim'а role get_user читает пользователя из БД
+        return authentication.get_user(authentication.get_validated_token(raw))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+
+    async def __call__(self, scope, receive, send):
+        raw = raw_token(scope)
+        if raw:
+            user = await user_for_token(raw)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
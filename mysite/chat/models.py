@@ -14,3 +14,7 @@ class Message(models.Model):
     image_chat = models.ImageField(upload_to='chats_image/', null=True, blank=True)
     video_chat = models.FileField(upload_to='videos/', null=True, blank=True)
     crated_data = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # История чата листается по (crated_data, id) внутри чата (chat.history)
+        indexes = [models.Index(fields=['chats', 'crated_data', 'id'], name='chat_message_timeline')]
@@ -0,0 +1,18 @@
+from rest_framework import serializers
+
+from logo_app.models import UserProfile
+from .models import Message
+
+
+class MessageAuthorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserProfile
+        fields = ['id', 'username', 'avatar']
+
+
+class MessageSerializer(serializers.ModelSerializer):
+    author = MessageAuthorSerializer()
+
+    class Meta:
+        model = Message
+        fields = ['id', 'author', 'text', 'image_chat', 'video_chat', 'crated_data']
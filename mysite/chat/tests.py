@@ -1,3 +1,118 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logo_app.authentication import tokens_for_user
+from logo_app.models import UserProfile
+
+from .consumers import ChatConsumer
+from .middleware import JWTAuthMiddleware
+from .models import Chat, Message
+
+
+def make_user(username):
+    # Пароль не нужен (токены выдаём напрямую), PBKDF2 только замедлил бы тесты
+    return UserProfile.objects.create(username=username, email=f'{username}@example.com', password='!')
+
+
+def auth_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(user).access_token}')
+    return client
+
+
+class JWTAuthMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('student')
+        self.token = str(tokens_for_user(self.user).access_token)
+
+    def _user(self, **scope):
+        seen = {}
+
+        async def inner(scope, receive, send):
+            seen['user'] = scope['user']
+
+        scope = {'type': 'websocket', 'user': AnonymousUser(), **scope}
+        async_to_sync(JWTAuthMiddleware(inner))(scope, None, None)
+        return seen['user']
+
+    def test_token_in_query_string(self):
+        user = self._user(query_string=f'token={self.token}'.encode())
+        self.assertTrue(user.is_authenticated)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_token_in_authorization_header(self):
+        user = self._user(headers=[(b'authorization', f'Bearer {self.token}'.encode())])
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_invalid_token_keeps_anonymous(self):
+        self.assertFalse(self._user(query_string=b'token=broken').is_authenticated)
+
+
+class ChatHistoryTests(TestCase):
+
+    def setUp(self):
+        self.member, self.stranger = make_user('member'), make_user('stranger')
+        self.chat = Chat.objects.create()
+        self.chat.person.add(self.member)
+        self.url = reverse('chat_history', args=[self.chat.pk])
+
+    def _messages(self, count, created):
+        Message.objects.bulk_create([Message(chats=self.chat, author=self.member, text=str(i)) for i in range(count)])
+        # Одинаковое время, как у сообщений из одной пачки chat.buffer — порядок решает id
+        Message.objects.filter(chats=self.chat).update(crated_data=created)
+
+    def test_only_members_read_history(self):
+        self.assertEqual(auth_client(self.stranger).get(self.url).status_code, 403)
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+        self.assertEqual(auth_client(self.member).get(self.url).status_code, 200)
+
+    def test_cursor_pages_are_stable(self):
+        self._messages(5, timezone.now() - timedelta(minutes=1))
+        expected = list(Message.objects.order_by('-id').values_list('id', flat=True))
+        client = auth_client(self.member)
+
+        response = client.get(self.url, {'limit': 2})
+        seen = [message['id'] for message in response.data['results']]
+        # Новое сообщение между страницами не сдвигает следующие
+        Message.objects.create(chats=self.chat, author=self.member, text='новое')
+        while response.data['next']:
+            response = client.get(response.data['next'])
+            seen += [message['id'] for message in response.data['results']]
+        self.assertEqual(seen, expected)
+
+    def test_broken_cursor(self):
+        response = auth_client(self.member).get(self.url, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ChatConsumerMembershipTests(TestCase):
+
+    def _receive(self, is_member):
+        consumer = ChatConsumer()
+        consumer.chat_id, consumer.author_id, consumer.is_member = 1, 2, is_member
+        consumer.room_group_name = 'chat_1'
+        consumer.channel_layer = mock.Mock(group_send=mock.AsyncMock())
+        consumer.send = mock.AsyncMock()
+        with mock.patch('chat.consumers.message_buffer.add', new_callable=mock.AsyncMock) as add:
+            async_to_sync(consumer.receive)(json.dumps({'message': 'привет'}))
+        return consumer, add
+
+    def test_stranger_cannot_write(self):
+        consumer, add = self._receive(is_member=False)
+        add.assert_not_awaited()
+        consumer.channel_layer.group_send.assert_not_awaited()
+        self.assertEqual(json.loads(consumer.send.await_args.kwargs['text_data'])['type'], 'error')
 
-# Create your tests here.
+    def test_member_message_is_buffered_and_sent(self):
+        consumer, add = self._receive(is_member=True)
+        add.assert_awaited_once_with(1, 2, 'привет')
+        consumer.channel_layer.group_send.assert_awaited_once()
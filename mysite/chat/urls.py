@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import ChatSocketInfoView
+from .views import ChatSocketInfoView, ChatHistoryAPIView
 
 urlpatterns = [
     path("ws_doc/", ChatSocketInfoView.as_view(), name="ws_doc"),
+    path("<int:chat_id>/messages/", ChatHistoryAPIView.as_view(), name="chat_history"),
 ]
@@ -1,7 +1,11 @@
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import status, generics, permissions
+from rest_framework.exceptions import PermissionDenied
+
+from .history import MessageKeysetPagination, chat_messages, is_member
+from .serializers import MessageSerializer
 
 
 class ChatSocketInfoView(APIView):
@@ -17,6 +21,10 @@ class ChatSocketInfoView(APIView):
         ws://127.0.0.1:8000/ws/chat/general/?token=
 
         Формат сообщений: JSON.
+
+        История: {"action": "load_older", "cursor": null, "limit": 50} —
+        ответ {"type": "history", "messages": [...], "next": <курсор более старой страницы>}.
+        REST: GET /chat/<id>/messages/
         """
     )
     def post(self, request):
@@ -24,3 +32,19 @@ class ChatSocketInfoView(APIView):
             "message": "Для подключения используйте /ws/chat/general/?token= с JSON-сообщениями"
         }
         return Response(data, status=status.HTTP_200_OK)
+
+
+class ChatHistoryAPIView(generics.ListAPIView):
+    """
+    История чата от новых к старым: ?limit=, следующая (более старая) страница — по ссылке next.
+    Доступна только участникам чата.
+    """
+    serializer_class = MessageSerializer
+    pagination_class = MessageKeysetPagination
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        chat_id = self.kwargs['chat_id']
+        if not is_member(chat_id, self.request.user.pk):
+            raise PermissionDenied('Вы не участник этого чата.')
+        return chat_messages(chat_id)
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .checks import cache_is_shared
+from .models import PurchasedCourse
+
+# Проверки доступа для permissions.py. Каждая — один EXISTS по индексам
+# (PurchasedCourse: unique (user, course), Course.owner). Результат живёт на время запроса,
+# а при общем кэше (Redis) — ещё и между запросами: покупки и смена владельца курса
+# сбрасывают ключи после коммита (signals.py). Кэш в памяти процесса для этого не годится —
+# сброс увидел бы только один воркер, поэтому без общего кэша остаётся только кэш запроса.
+
+ACCESS_CACHE_TIMEOUT = getattr(settings, 'ACCESS_CACHE_TIMEOUT', 300)
+
+
+def bought_from_key(student_id, owner_id):
+    return f'access:bought-from:{student_id}:{owner_id}'
+
+
+def _cached(request, key, check):
+    # Кэш запроса живёт на HttpRequest — общий для всех permission-классов одного запроса
+    request = getattr(request, '_request', request)
+    local = request.__dict__.setdefault('_access_cache', {})
+    if key not in local:
+        shared = cache_is_shared()
+        value = cache.get(key) if shared else None
+        if value is None:
+            value = check()
+            if shared:
+                cache.set(key, value, ACCESS_CACHE_TIMEOUT)
+        local[key] = value
+    return local[key]
+
+
+def forget(keys):
+    # После коммита, иначе параллельный запрос успеет закэшировать значение до изменения
+    if keys and cache_is_shared():
+        cache.delete_many(keys)
+
+
+def has_role(user, role):
+    # У AnonymousUser нет role — для него просто False
+    return getattr(user, 'role', None) == role
+
+
+def is_self(user, profile):
+    return user.is_authenticated and user.pk == profile.pk
+
+
+def lesson_is_open(lesson):
+    # Закрытый урок недоступен никому, в том числе владельцу курса и купившим его
+    return lesson.status == 'Открытый'
+
+
+def has_bought_from(request, student_id, owner_id):
+    """Купил ли студент хотя бы один курс владельца."""
+    return _cached(request, bought_from_key(student_id, owner_id), lambda: PurchasedCourse.objects.filter(
+        user_id=student_id, course__owner_id=owner_id).exists())
+
+
+def course_keys(course_id, owner_ids):
+    """Ключи bought_from всех студентов курса для указанных владельцев — одним запросом."""
+    student_ids = PurchasedCourse.objects.filter(course_id=course_id).values_list('user_id', flat=True)
+    return [bought_from_key(student_id, owner_id) for student_id in student_ids for owner_id in owner_ids]
@@ -1,5 +1,21 @@
 from django.contrib import admin
 from .models import *
+from .public_api import schedule_export
+
+
+class PublicApiExportMixin:
+    # После сохранения (вместе с инлайнами) или удаления перевыгружаем статический JSON — после коммита
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        schedule_export()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        schedule_export()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        schedule_export()
 
 class HighlightInline(admin.TabularInline):
     model = Highlight
@@ -17,15 +33,21 @@ class AboutUsImageInline(admin.TabularInline):
     model = AboutUsImage
     extra = 1
 
-class HomeAdmin(admin.ModelAdmin):
+class HomeAdmin(PublicApiExportMixin, admin.ModelAdmin):
     inlines = [HighlightInline]
 
-class WhyCourseAdmin(admin.ModelAdmin):
+class WhyCourseAdmin(PublicApiExportMixin, admin.ModelAdmin):
     inlines = [WhyCourseHighlightInline]
 
-class AboutUsAdmin(admin.ModelAdmin):
+class AboutUsAdmin(PublicApiExportMixin, admin.ModelAdmin):
     inlines = [AboutUsImageInline]
 
+class CategoryAdmin(PublicApiExportMixin, admin.ModelAdmin):
+    pass
+
+class TitleCourseAdmin(PublicApiExportMixin, admin.ModelAdmin):
+    pass
+
 class CourseAdmin(admin.ModelAdmin):
     inlines = [LessonInline]
 
@@ -33,12 +55,14 @@ admin.site.register(UserProfile)
 admin.site.register(Home, HomeAdmin)
 admin.site.register(WhyCourse, WhyCourseAdmin)
 admin.site.register(AboutUs, AboutUsAdmin)
-admin.site.register(Category)
+admin.site.register(Category, CategoryAdmin)
 admin.site.register(Course, CourseAdmin)
 admin.site.register(CourseReview)
 admin.site.register(LessonReview)
 admin.site.register(TitleForCourse)
 admin.site.register(TitleForReview)
 admin.site.register(EmailTitle)
-admin.site.register(TitleCourse)
+admin.site.register(TitleCourse, TitleCourseAdmin)
+admin.site.register(OutboundEmail)
+admin.site.register(NewsletterCampaign)
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LogoAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'logo_app'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+from .tokens import CachedBlacklistRefreshToken
+
+# Аутентификация по access-токену без запроса к БД: id и role берутся из claims,
+# UserProfile загружается, только если представлению нужен настоящий объект (profile_of).
+# Роль в токене обновится при следующем входе; отзыв доступа — через срок жизни access-токена.
+
+ROLE_CLAIM = 'role'
+
+
+def tokens_for_user(user):
+    refresh = CachedBlacklistRefreshToken.for_user(user)
+    # Claims refresh-токена копируются во все выпущенные из него access-токены
+    refresh[ROLE_CLAIM] = user.role
+    refresh['username'] = user.username
+    return refresh
+
+
+class RoleTokenUser(TokenUser):
+
+    @cached_property
+    def id(self):
+        return int(super().id)
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def role(self):
+        return self.token[ROLE_CLAIM]
+
+    @cached_property
+    def profile(self):
+        return get_user_model().objects.get(pk=self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, get_user_model()):
+            return self.id == other.pk
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+def profile_of(user):
+    """Настоящий UserProfile для request.user (RoleTokenUser грузится из БД один раз)."""
+    return user.profile if isinstance(user, RoleTokenUser) else user
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            # Токены, выданные до появления claim'а role, — по-старому, с чтением пользователя
+            return JWTAuthentication.get_user(self, validated_token)
+        return RoleTokenUser(validated_token)
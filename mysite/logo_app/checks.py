@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Версия снимка главной (logo_app.landing) и фильтр отозванных токенов (logo_app.tokens)
+# должны быть видны всем процессам — с кэшем в памяти процесса остальные воркеры
+# узнают об изменениях только по истечении таймаута.
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [Warning(
+        'Кэш по умолчанию живёт в памяти процесса: при нескольких воркерах сброс снимка '
+        'главной страницы виден только одному из них, фильтр отозванных токенов отключён.',
+        hint='Задайте REDIS_URL (общий кэш Redis).',
+        id='logo_app.W001',
+    )]
@@ -0,0 +1,108 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Lesson
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindCounter:
+    """
+    Копит инкременты счётчика в памяти процесса и сбрасывает их пачкой:
+    UPDATE ... SET field = field + CASE pk WHEN ... END WHERE pk IN (...).
+    Сброс — в фоновом потоке по таймеру или раньше, когда накопился порог;
+    запрос никогда не ждёт записи в БД. Ошибка сброса не теряет инкременты:
+    они возвращаются в буфер, поток пишет в лог и пробует на следующем круге.
+    Каждый воркер gunicorn сбрасывает только свои инкременты через F(),
+    поэтому процессы не мешают друг другу и ничего не теряется.
+    """
+    chunk_size = 500
+
+    def __init__(self, model, field, interval, threshold):
+        self.model = model
+        self.field = field
+        self.interval = interval
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._total = 0
+        self._pid = None
+        self._thread = None
+        self._wake = threading.Event()
+
+    def _ensure_worker(self):
+        # После fork (gunicorn --preload) поток и буфер родителя не наследуются
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending, self._total = {}, 0
+            self._wake = threading.Event()
+            self._thread = None
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f'{self.model.__name__}-{self.field}-flush',
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось сбросить счётчик %s.%s', self.model.__name__, self.field)
+            finally:
+                connection.close()
+
+    def hit(self, pk, amount=1):
+        """Добавляет инкремент и возвращает ещё не сохранённую сумму по этому pk."""
+        with self._lock:
+            self._ensure_worker()
+            pending = self._pending.get(pk, 0) + amount
+            self._pending[pk] = pending
+            self._total += amount
+            if self._total >= self.threshold:
+                # Порог — будим фоновый поток, сам запрос в БД не пишет
+                self._wake.set()
+        return pending
+
+    def pending(self, pk):
+        with self._lock:
+            return self._pending.get(pk, 0)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending, self._total = self._pending, {}, 0
+        if not batch:
+            return 0
+        items = list(batch.items())
+        flushed = 0
+        try:
+            for start in range(0, len(items), self.chunk_size):
+                chunk = items[start:start + self.chunk_size]
+                increment = Case(*(When(pk=pk, then=Value(amount)) for pk, amount in chunk),
+                                 default=Value(0), output_field=IntegerField())
+                self.model.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                    **{self.field: F(self.field) + increment})
+                flushed += len(chunk)
+        except Exception:
+            # Несохранённое возвращаем в буфер, попробуем в следующий раз
+            with self._lock:
+                for pk, amount in items[flushed:]:
+                    self._pending[pk] = self._pending.get(pk, 0) + amount
+                    self._total += amount
+            raise
+        return len(batch)
+
+
+lesson_views = WriteBehindCounter(
+    Lesson, 'views',
+    interval=getattr(settings, 'LESSON_VIEWS_FLUSH_INTERVAL', 5),
+    threshold=getattr(settings, 'LESSON_VIEWS_FLUSH_THRESHOLD', 100),
+)
+atexit.register(lesson_views.flush)
@@ -0,0 +1,41 @@
+from django.db import models
+from django.urls import reverse
+from rest_framework import serializers
+
+from .images import srcset
+
+
+class ResponsiveImageField(serializers.ImageField):
+    """
+    Обычный URL картинки; с ?images=srcset в запросе —
+    {'src': URL оригинала, 'webp': {'320w': URL, ...}, 'jpeg': {...}}.
+    """
+
+    def to_representation(self, value):
+        url = super().to_representation(value)
+        request = self.context.get('request')
+        if not url or request is None or request.query_params.get('images') != 'srcset':
+            return url
+        variants = srcset(value, request.build_absolute_uri)
+        return {'src': url, **(variants or {})}
+
+
+class ResponsiveImageModelSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: ResponsiveImageField,
+    }
+
+
+class LessonVideoField(serializers.FileField):
+    """
+    Вместо URL файла — ссылка на /lesson/<id>/video: прямой ссылки на видео нет,
+    файл отдаётся только после проверки доступа.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = reverse('lesson-video', args=[value.instance.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
@@ -0,0 +1,85 @@
+from django.db.models import Count
+from rest_framework.exceptions import ValidationError
+
+COURSE_STATUSES = ('Бесплатно', 'Платно')
+
+
+def _int_list(params, name):
+    value = params.get(name)
+    if not value:
+        return []
+    try:
+        return [int(item) for item in value.split(',')]
+    except ValueError:
+        raise ValidationError({name: 'Ожидается целое число или список через запятую.'})
+
+
+def _int(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'Ожидается целое число.'})
+
+
+def parse_course_filters(params):
+    status = params.get('status_course') or None
+    if status is not None and status not in COURSE_STATUSES:
+        raise ValidationError({'status_course': f'Допустимые значения: {", ".join(COURSE_STATUSES)}.'})
+    return {
+        'category': _int_list(params, 'category'),
+        'status_course': status,
+        'price_min': _int(params, 'price_min'),
+        'price_max': _int(params, 'price_max'),
+        'owner': _int(params, 'owner'),
+    }
+
+
+def _filter_range(queryset, filters):
+    if filters['price_min'] is not None:
+        queryset = queryset.filter(price__gte=filters['price_min'])
+    if filters['price_max'] is not None:
+        queryset = queryset.filter(price__lte=filters['price_max'])
+    if filters['owner'] is not None:
+        queryset = queryset.filter(owner_id=filters['owner'])
+    return queryset
+
+
+def filter_courses(queryset, filters):
+    queryset = _filter_range(queryset, filters)
+    if filters['category']:
+        queryset = queryset.filter(category_id__in=filters['category'])
+    if filters['status_course']:
+        queryset = queryset.filter(status_course=filters['status_course'])
+    return queryset
+
+
+def course_facets(queryset, filters):
+    """
+    Счётчики для фильтров каталога одним GROUP BY (category, status_course).
+    Счётчик категорий учитывает выбранный статус, счётчик статусов —
+    выбранные категории, но не собственный фильтр.
+    """
+    rows = (_filter_range(queryset, filters).order_by()
+            .values('category_id', 'category__category_name', 'status_course')
+            .annotate(count=Count('id')))
+
+    categories = {}
+    statuses = dict.fromkeys(COURSE_STATUSES, 0)
+    for row in rows:
+        if not filters['status_course'] or row['status_course'] == filters['status_course']:
+            category = categories.setdefault(row['category_id'], {
+                'id': row['category_id'],
+                'category_name': row['category__category_name'],
+                'count': 0,
+            })
+            category['count'] += row['count']
+        if not filters['category'] or row['category_id'] in filters['category']:
+            statuses[row['status_course']] = statuses.get(row['status_course'], 0) + row['count']
+
+    return {
+        'category': sorted(categories.values(), key=lambda item: item['id']),
+        'status_course': statuses,
+    }
@@ -0,0 +1,130 @@
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .storage import digest_from_name
+
+logger = logging.getLogger(__name__)
+
+# Уменьшенные копии картинок (WebP/JPEG) фиксированной ширины.
+# Лежат в MEDIA_ROOT/derivatives/<sha256[:2]>/<sha256>/<ширина>.<формат>:
+# ключ — хэш содержимого, поэтому сами файлы не устаревают и их можно кэшировать навсегда.
+# В кэше Django — только карта «имя файла -> копии» с конечным временем жизни:
+# новая загрузка получает новое имя и новую запись, старые записи истекают сами.
+
+DERIVATIVE_WIDTHS = getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 1280))
+DERIVATIVE_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+DERIVATIVE_QUALITY = 80
+VARIANTS_CACHE_TIMEOUT = getattr(settings, 'IMAGE_VARIANTS_CACHE_TIMEOUT', 60 * 60 * 24)
+
+# Обычное файловое хранилище: имена копий задаём сами, без переименований
+derivative_storage = FileSystemStorage()
+
+
+def _cache_key(prefix, field_file):
+    return f'{prefix}:{field_file.storage.__class__.__name__}:{field_file.name}'
+
+
+def content_key(field_file):
+    # В CAS-хранилище хэш содержимого уже в имени файла
+    digest = digest_from_name(field_file.name)
+    if digest:
+        return digest
+    cache_key = _cache_key('image-key', field_file)
+    key = cache.get(cache_key)
+    if key is None:
+        digest = hashlib.sha256()
+        field_file.open('rb')
+        try:
+            for chunk in field_file.chunks():
+                digest.update(chunk)
+        finally:
+            field_file.close()
+        key = digest.hexdigest()
+        cache.set(cache_key, key, VARIANTS_CACHE_TIMEOUT)
+    return key
+
+
+def derivative_name(key, width, extension):
+    return f'derivatives/{key[:2]}/{key}/{width}.{extension}'
+
+
+def _widths_for(original_width):
+    # Не увеличиваем: ширины не больше оригинала, плюс сам оригинал, если он меньше максимальной ширины
+    widths = [width for width in DERIVATIVE_WIDTHS if width <= original_width]
+    if original_width < max(DERIVATIVE_WIDTHS) and original_width not in widths:
+        widths.append(original_width)
+    return widths
+
+
+def _encode(image, width, image_format):
+    height = max(round(image.height * width / image.width), 1)
+    resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+    if image_format == 'JPEG' and resized.mode != 'RGB':
+        background = Image.new('RGB', resized.size, (255, 255, 255))
+        rgba = resized.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        resized = background
+    buffer = io.BytesIO()
+    resized.save(buffer, image_format, quality=DERIVATIVE_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file):
+    """Создаёт недостающие копии и возвращает {формат: {ширина: имя файла}}."""
+    cache_key = _cache_key('image-variants', field_file)
+    variants = cache.get(cache_key)
+    if variants is not None:
+        return variants
+
+    key = content_key(field_file)
+
+    field_file.open('rb')
+    try:
+        image = ImageOps.exif_transpose(Image.open(field_file))
+        image.load()
+    except (UnidentifiedImageError, OSError):
+        # Не растровая картинка (SVG, битый файл) — запоминаем, что копий нет
+        logger.warning('Не удалось открыть картинку %s', field_file.name)
+        cache.set(cache_key, {}, VARIANTS_CACHE_TIMEOUT)
+        return {}
+    finally:
+        field_file.close()
+
+    variants = {}
+    for extension, image_format in DERIVATIVE_FORMATS.items():
+        variants[extension] = {}
+        for width in _widths_for(image.width):
+            name = derivative_name(key, width, extension)
+            if not derivative_storage.exists(name):
+                derivative_storage.save(name, ContentFile(_encode(image, width, image_format)))
+            variants[extension][width] = name
+    cache.set(cache_key, variants, VARIANTS_CACHE_TIMEOUT)
+    return variants
+
+
+def image_variants(field_file):
+    """Как generate_variants, но не падает на битых/не растровых файлах."""
+    if not field_file:
+        return None
+    try:
+        return generate_variants(field_file)
+    except Exception:
+        logger.warning('Не удалось построить копии для %s', field_file.name, exc_info=True)
+        return None
+
+
+def srcset(field_file, build_url=lambda url: url):
+    variants = image_variants(field_file)
+    if not variants:
+        return None
+    return {
+        extension: {f'{width}w': build_url(derivative_storage.url(name)) for width, name in names.items()}
+        for extension, names in variants.items()
+    }
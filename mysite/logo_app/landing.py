@@ -0,0 +1,54 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .prefetch import apply_prefetch_plan
+from .models import Home, WhyCourse, AboutUs, TitleForCourse, TitleForReview, TitleCourse, EmailTitle
+from .serializers import (HomeSerializers, WhyCourseSerializer, AboutUsSerializer, TitleForCourseSerializer,
+                          TitleForReviewSerializer, TitleCourseSerializer, EmailTitleSerializer)
+
+# Всё для главной страницы одним ответом. Снимок кэшируется под ключом с версией;
+# сохранение любой из моделей в админке меняет версию (см. signals.py).
+# Версия лежит в общем кэше (REDIS_URL) — новую видят все воркеры сразу (см. checks.py).
+
+LANDING_VERSION_KEY = 'landing:version'
+LANDING_CACHE_TIMEOUT = getattr(settings, 'LANDING_CACHE_TIMEOUT', 60 * 60 * 24)
+
+LANDING_SECTIONS = (
+    ('home', Home, HomeSerializers),
+    ('whycourse', WhyCourse, WhyCourseSerializer),
+    ('aboutus', AboutUs, AboutUsSerializer),
+    ('title_for_course', TitleForCourse, TitleForCourseSerializer),
+    ('titlereview', TitleForReview, TitleForReviewSerializer),
+    ('titlecourse', TitleCourse, TitleCourseSerializer),
+    ('titleemail', EmailTitle, EmailTitleSerializer),
+)
+
+
+def landing_version():
+    return cache.get_or_set(LANDING_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_landing():
+    # Новая случайная версия: старые снимки просто перестают читаться и истекают сами
+    cache.set(LANDING_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def build_landing(request):
+    context = {'request': request}
+    return {
+        name: serializer_class(apply_prefetch_plan(model.objects.all(), serializer_class),
+                               many=True, context=context).data
+        for name, model, serializer_class in LANDING_SECTIONS
+    }
+
+
+def landing_snapshot(request):
+    # Абсолютные URL картинок зависят от хоста и ?images=srcset
+    key = f'landing:{landing_version()}:{request.get_host()}:{request.query_params.get("images", "")}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_landing(request)
+        cache.set(key, snapshot, LANDING_CACHE_TIMEOUT)
+    return snapshot
@@ -0,0 +1,97 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Очередь писем в БД. Воркер забирает пачку «созревших» писем, продлевая им
+# next_attempt_at на время аренды (другие воркеры их не возьмут), и отправляет
+# через одно открытое соединение. Ошибка — повтор с экспоненциальной задержкой.
+
+MAIL_QUEUE_BATCH_SIZE = getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50)
+MAIL_QUEUE_MAX_ATTEMPTS = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 6)
+MAIL_QUEUE_RETRY_BASE = getattr(settings, 'MAIL_QUEUE_RETRY_BASE', 30)  # секунд, удваивается с каждой попыткой
+MAIL_QUEUE_LEASE = timedelta(minutes=5)
+
+
+def enqueue_mail(subject, message, from_email, recipient_list):
+    """Как django.core.mail.send_mail, но письмо только ставится в очередь."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(MAIL_QUEUE_RETRY_BASE * 2 ** (attempts - 1), 6 * 60 * 60))
+
+
+def claim_batch(size=MAIL_QUEUE_BATCH_SIZE):
+    now = timezone.now()
+    with transaction.atomic():
+        # skip_locked: параллельные воркеры на PostgreSQL не ждут друг друга и не берут одно письмо
+        batch = list(OutboundEmail.objects
+                     .select_for_update(skip_locked=True)
+                     .filter(status='pending', next_attempt_at__lte=now)
+                     .order_by('next_attempt_at', 'id')[:size])
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[mail.pk for mail in batch]).update(
+                next_attempt_at=now + MAIL_QUEUE_LEASE)
+    return batch
+
+
+def _mark_failed(mail, error):
+    mail.attempts += 1
+    mail.last_error = str(error)[:2000]
+    if mail.attempts >= MAIL_QUEUE_MAX_ATTEMPTS:
+        mail.status = 'failed'
+    else:
+        mail.next_attempt_at = timezone.now() + retry_delay(mail.attempts)
+    mail.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_batch(batch, connection=None):
+    """Отправляет пачку через одно соединение; возвращает (отправлено, ошибок)."""
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        for mail in batch:
+            message = EmailMessage(mail.subject, mail.body, mail.from_email, mail.recipients, connection=connection)
+            try:
+                connection.open()  # no-op, если соединение уже открыто
+                message.send()
+            except Exception as error:
+                logger.warning('Не удалось отправить письмо #%s: %s', mail.pk, error)
+                _mark_failed(mail, error)
+                failed += 1
+                # После ошибки соединение может быть в неопределённом состоянии — переоткроем
+                connection.close()
+                continue
+            mail.status = 'sent'
+            mail.attempts += 1
+            mail.sent_date = timezone.now()
+            mail.save(update_fields=['status', 'attempts', 'sent_date'])
+            sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def drain(batch_size=MAIL_QUEUE_BATCH_SIZE, connection=None):
+    """Отправляет всё, что созрело к этому моменту; возвращает (отправлено, ошибок)."""
+    total_sent = total_failed = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return total_sent, total_failed
+        sent, failed = send_batch(batch, connection)
+        total_sent += sent
+        total_failed += failed
@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from logo_app.media_probe import probe_path_seconds
+from logo_app.models import Lesson
+from logo_app.stats import rebuild_course_stats
+
+
+class Command(BaseCommand):
+    help = 'Заполняет Lesson.video_time по заголовкам видеофайлов (пул процессов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Число процессов')
+        parser.add_argument('--only-empty', action='store_true', help='Только уроки с нулевой длительностью')
+        parser.add_argument('--dry-run', action='store_true', help='Показать изменения без записи')
+
+    def handle(self, *args, **options):
+        lessons = Lesson.objects.exclude(video='')
+        if options['only_empty']:
+            lessons = lessons.filter(video_time=timedelta())
+        lessons = {lesson.pk: lesson for lesson in lessons.only('id', 'course_id', 'video', 'video_time')}
+        items = [(pk, lesson.video.path) for pk, lesson in lessons.items()]
+
+        changed, failed = [], []
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for pk, seconds in pool.map(probe_path_seconds, items, chunksize=16):
+                if seconds is None:
+                    failed.append(pk)
+                    continue
+                lesson = lessons[pk]
+                duration = timedelta(seconds=seconds)
+                if lesson.video_time != duration:
+                    self.stdout.write(f'Урок {pk}: {lesson.video_time} -> {duration}')
+                    lesson.video_time = duration
+                    changed.append(lesson)
+
+        if changed and not options['dry_run']:
+            Lesson.objects.bulk_update(changed, ['video_time'], batch_size=500)
+            # bulk_update обходит сигналы — пересчитываем статистику затронутых курсов
+            rebuild_course_stats({lesson.course_id for lesson in changed})
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Не распознаны: {", ".join(map(str, sorted(failed)))}'))
+        self.stdout.write(self.style.SUCCESS(f'Проверено: {len(items)}, обновлено: {len(changed)}'))
@@ -0,0 +1,134 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from logo_app.models import MediaBlob
+from logo_app.storage import cas_file_fields, digest_from_name
+
+
+class Command(BaseCommand):
+    help = ('Сборка мусора в CAS-хранилище медиа: сверяет счётчики ссылок и удаляет '
+            'файлы без ссылок; с --migrate сначала переносит старые файлы в CAS '
+            '(и видео уроков из MEDIA_ROOT в защищённое хранилище)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--migrate', action='store_true', help='Перенести файлы со старыми именами в CAS')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Не трогать файлы моложе N минут (загрузки, ещё не сохранённые в БД)')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет сделано')
+
+    def handle(self, *args, **options):
+        if options['migrate']:
+            self.migrate_legacy(options['dry_run'])
+        self.collect(timedelta(minutes=options['grace_minutes']), options['dry_run'])
+
+    def migrate_legacy(self, dry_run):
+        moved, legacy = 0, set()
+        for model, field in cas_file_fields():
+            rows = (model._default_manager.exclude(**{field.attname: ''})
+                    .exclude(**{f'{field.attname}__startswith': field.storage.prefix + '/'})
+                    .values_list('pk', field.attname))
+            for pk, name in rows.iterator(chunk_size=500):
+                # Файл поля, сменившего хранилище (видео уроков), ещё лежит в MEDIA_ROOT
+                source = next((storage for storage in (field.storage, default_storage) if storage.exists(name)), None)
+                if source is None:
+                    self.stdout.write(self.style.WARNING(f'{model.__name__}#{pk}: нет файла {name}'))
+                    continue
+                legacy.add((source, name))
+                if dry_run:
+                    self.stdout.write(f'{model.__name__}#{pk}: {name} -> {field.storage.prefix}/')
+                    continue
+                with source.open(name, 'rb') as file:
+                    blob_name = field.storage.save(name, file)
+                # update() без сигналов: счётчик уже увеличен в save()
+                model._default_manager.filter(pk=pk).update(**{field.attname: blob_name})
+                moved += 1
+
+        if dry_run:
+            return
+        # Старые файлы удаляем только после того, как все строки переписаны;
+        # для общего файла из CAS delete() только уменьшает счётчик
+        for storage, name in legacy:
+            storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в CAS: {moved}, удалено старых файлов: {len(legacy)}'))
+
+    def collect(self, grace, dry_run):
+        # Mark: реальные ссылки из БД — источник истины для refcount
+        references = Counter()
+        storages = {}  # префикс имени -> хранилище (обычные медиа и защищённые видео)
+        for model, field in cas_file_fields():
+            storages[field.storage.prefix] = field.storage
+            names = (model._default_manager.filter(**{f'{field.attname}__startswith': field.storage.prefix + '/'})
+                     .values_list(field.attname, flat=True))
+            references.update(names.iterator(chunk_size=2000))
+        if not storages:
+            return
+
+        def storage_for(name):
+            return storages.get(name.split('/', 1)[0])
+
+        fixed = 0
+        with transaction.atomic():
+            for blob in MediaBlob.objects.select_for_update().iterator(chunk_size=2000):
+                if blob.refcount != references.get(blob.name, 0):
+                    fixed += 1
+                    if not dry_run:
+                        MediaBlob.objects.filter(pk=blob.pk).update(refcount=references.get(blob.name, 0))
+            known = set(MediaBlob.objects.values_list('name', flat=True))
+            missing = [MediaBlob(name=name, size=storage_for(name).size(name), refcount=count)
+                       for name, count in references.items()
+                       if name not in known and storage_for(name).exists(name)]
+            if missing and not dry_run:
+                MediaBlob.objects.bulk_create(missing, batch_size=500)
+
+        # Sweep: файлы без ссылок старше grace
+        cutoff = timezone.now() - grace
+        orphans = list(MediaBlob.objects.filter(refcount__lte=0, created_date__lt=cutoff)
+                       .exclude(name__in=list(references)).values_list('pk', 'name'))
+        removed_bytes = 0
+        removed = 0
+        for pk, name in orphans:
+            self.stdout.write(f'Удаляю {name}')
+            if dry_run:
+                removed += 1
+                continue
+            # Перепроверка под блокировкой строки, файл и строка удаляются в одной транзакции:
+            # если файл успели переиспользовать (refcount > 0), не трогаем его
+            with transaction.atomic():
+                blob = MediaBlob.objects.select_for_update().filter(pk=pk, refcount__lte=0).first()
+                if blob is None:
+                    continue
+                storage = storage_for(name)
+                if storage and storage.exists(name):
+                    removed_bytes += storage.size(name)
+                    storage.purge(name)
+                blob.delete()
+            removed += 1
+
+        # Файлы в cas/, о которых не знает БД (оборванные записи, *.tmp)
+        known = set(MediaBlob.objects.values_list('name', flat=True))
+        stray = 0
+        for prefix, storage in storages.items():
+            for directory, _, files in os.walk(storage.path(prefix)):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                    if name in known or name in references:
+                        continue
+                    if datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc) >= cutoff:
+                        continue
+                    if digest_from_name(name) or filename.endswith('.tmp'):
+                        stray += 1
+                        self.stdout.write(f'Удаляю неучтённый файл {name}')
+                        if not dry_run:
+                            removed_bytes += os.path.getsize(path)
+                            os.remove(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {fixed}, удалено файлов: {removed + stray}, '
+            f'освобождено байт: {removed_bytes}'))
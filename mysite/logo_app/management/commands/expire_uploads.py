@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from logo_app.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = ('Удаляет брошенные докачиваемые загрузки видео (LessonUpload без урока) и их файлы .part; '
+            'запускать по расписанию (cron)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Загрузки без новых кусков дольше N часов')
+
+    def handle(self, *args, **options):
+        expired, removed = expire_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {expired}, лишних файлов .part: {removed}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from logo_app.public_api import PUBLIC_API_ROOT, export_public_api
+
+
+class Command(BaseCommand):
+    help = 'Рендерит публичный контент (главная, о нас, категории...) в статические JSON-файлы для nginx'
+
+    def handle(self, *args, **options):
+        manifest = export_public_api()
+        for name, filename in manifest.items():
+            self.stdout.write(f'{name}: {filename}')
+        self.stdout.write(self.style.SUCCESS(f'Выгружено файлов: {len(manifest)} в {PUBLIC_API_ROOT}'))
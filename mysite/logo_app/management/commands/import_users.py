@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from logo_app.userimport import USER_IMPORT_BATCH_SIZE, USER_IMPORT_FORMATS, USER_IMPORT_WORKERS, import_users, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Импортирует пользователей из CSV или NDJSON (username, email, password[, role]); '
+            'пароли хэшируются в пуле процессов, вставка пачками')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с пользователями')
+        parser.add_argument('--input', choices=USER_IMPORT_FORMATS, help='Формат; по умолчанию по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=USER_IMPORT_BATCH_SIZE, help='Строк в одном bulk_create')
+        parser.add_argument('--workers', type=int, default=USER_IMPORT_WORKERS, help='Процессов для хэширования паролей')
+
+    def handle(self, *args, **options):
+        input_format = options['input'] or options['path'].rsplit('.', 1)[-1].lower()
+        if input_format not in USER_IMPORT_FORMATS:
+            raise CommandError(f'Укажите --input: {", ".join(USER_IMPORT_FORMATS)}')
+        with open(options['path'], 'rb') as file:
+            report = import_users(read_rows(file, input_format), options['batch_size'], options['workers'])
+        for error in report.as_dict()['errors']:
+            details = '; '.join(f'{field}: {message}' for field, message in error['errors'].items())
+            self.stderr.write(f'Строка {error["row"]}: {details}')
+        self.stdout.write(self.style.SUCCESS(f'Создано пользователей: {report.created}, ошибок: {len(report.errors)}'))
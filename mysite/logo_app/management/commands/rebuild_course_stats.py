@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from logo_app.stats import find_drift, rebuild_course_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает CourseStats с нуля; с --check только ищет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только проверить, ничего не записывать')
+        parser.add_argument('--course', type=int, action='append', dest='courses', help='id курса (можно несколько)')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_drift(options['courses'])
+            for course_id, fields in sorted(drift.items()):
+                for field, (stored, expected) in fields.items():
+                    self.stdout.write(f'Курс {course_id}: {field} = {stored}, ожидается {expected}')
+            if drift:
+                raise CommandError(f'Расхождения в {len(drift)} курсах')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+
+        count = rebuild_course_stats(options['courses'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано курсов: {count}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from logo_app.rollup import find_rollup_drift, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводку владелец–студент (OwnerStudentRollup) с нуля; с --check только ищет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только проверить, ничего не записывать')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_rollup_drift()
+            for (owner_id, student_id), (stored, expected) in sorted(drift.items()):
+                self.stdout.write(f'Владелец {owner_id}, студент {student_id}: {stored}, ожидается {expected}')
+            if drift:
+                raise CommandError(f'Расхождения в {len(drift)} строках')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано строк: {count}'))
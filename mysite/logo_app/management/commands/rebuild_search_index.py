@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from logo_app import search
+from logo_app.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс курсов'
+
+    def handle(self, *args, **options):
+        search.create_search_table()
+        search.rebuild_index(Course.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано курсов: {Course.objects.count()}'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from logo_app.userimport import USER_IMPORT_BATCH_SIZE, USER_IMPORT_WORKERS, claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = ('Выполняет задания импорта пользователей из /user/import/; '
+            'с --loop работает постоянно как воркер')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Не завершаться, проверять очередь каждые --sleep секунд')
+        parser.add_argument('--sleep', type=float, default=2, help='Пауза между проверками пустой очереди')
+        parser.add_argument('--batch-size', type=int, default=USER_IMPORT_BATCH_SIZE, help='Строк в одном bulk_create')
+        parser.add_argument('--workers', type=int, default=USER_IMPORT_WORKERS, help='Процессов для хэширования паролей')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is not None:
+                run_job(job, options['batch_size'], options['workers'])
+                created = (job.report or {}).get('created', 0)
+                self.stdout.write(self.style.SUCCESS(f'Импорт {job.pk}: {job.status}, создано {created}'))
+            elif not options['loop']:
+                return
+            else:
+                time.sleep(options['sleep'])
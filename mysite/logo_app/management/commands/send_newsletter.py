@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from logo_app.models import NewsletterCampaign
+from logo_app.newsletter import NEWSLETTER_CHUNK_SIZE, NEWSLETTER_THREADS, CampaignUnavailable, run_campaign
+
+
+class Command(BaseCommand):
+    help = ('Рассылает письмо всем подписчикам RegisterEmail (без дублей по регистру). '
+            'Прерванную рассылку продолжает --campaign <id> с сохранённого чекпоинта')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', help='Тема новой рассылки')
+        parser.add_argument('--body', help='Текст письма')
+        parser.add_argument('--body-file', help='Файл с текстом письма')
+        parser.add_argument('--campaign', type=int, help='Продолжить существующую рассылку')
+        parser.add_argument('--threads', type=int, default=NEWSLETTER_THREADS, help='Потоков (SMTP-соединений)')
+        parser.add_argument('--chunk-size', type=int, default=NEWSLETTER_CHUNK_SIZE, help='Адресов в одной пачке')
+        parser.add_argument('--force', action='store_true',
+                            help='Отправить завершённую рассылку --campaign заново, с начала')
+
+    def handle(self, *args, **options):
+        campaign = self._campaign(options)
+        self.stdout.write(f'Рассылка #{campaign.pk} «{campaign.subject}», '
+                          f'чекпоинт: {campaign.last_email or "с начала"}')
+
+        def progress(campaign):
+            self.stdout.write(f'  отправлено {campaign.sent_count}, ошибок {campaign.failed_count}, '
+                              f'до {campaign.last_email}')
+
+        try:
+            sent, failed, elapsed = run_campaign(campaign, options['threads'], options['chunk_size'], progress,
+                                                 force=options['force'])
+        except CampaignUnavailable as error:
+            raise CommandError(f'{error}; повторить завершённую — --force' if campaign.finished_date else str(error))
+        rate = sent / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Рассылка #{campaign.pk}: отправлено {sent}, в очередь на повтор {failed}, '
+            f'{elapsed:.1f} с, {rate:.1f} писем/с'))
+
+    def _campaign(self, options):
+        if options['campaign']:
+            try:
+                return NewsletterCampaign.objects.get(pk=options['campaign'])
+            except NewsletterCampaign.DoesNotExist:
+                raise CommandError(f'Рассылка #{options["campaign"]} не найдена')
+        body = options['body']
+        if options['body_file']:
+            with open(options['body_file'], encoding='utf-8') as file:
+                body = file.read()
+        if not options['subject'] or not body:
+            raise CommandError('Для новой рассылки нужны --subject и --body (или --body-file)')
+        return NewsletterCampaign.objects.create(subject=options['subject'], body=body)
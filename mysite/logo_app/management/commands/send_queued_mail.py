@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from logo_app.mailqueue import MAIL_QUEUE_BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди OutboundEmail; с --loop работает постоянно как воркер'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Не завершаться, проверять очередь каждые --sleep секунд')
+        parser.add_argument('--sleep', type=float, default=2, help='Пауза между проверками пустой очереди')
+        parser.add_argument('--batch-size', type=int, default=MAIL_QUEUE_BATCH_SIZE,
+                            help='Писем на одно SMTP-соединение')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Отправлено: {sent}, ошибок: {failed}'))
+            if not options['loop']:
+                return
+            if not sent and not failed:
+                time.sleep(options['sleep'])
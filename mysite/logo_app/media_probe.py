@@ -0,0 +1,153 @@
+import os
+import struct
+from datetime import timedelta
+
+# Длительность видео по заголовкам контейнера, без декодирования:
+# Matroska/WebM — EBML Segment > Info (TimecodeScale, Duration),
+# MP4/MOV — moov > mvhd (timescale, duration).
+# Читаются только заголовки элементов, тяжёлые блоки (Cluster, mdat) пропускаются seek'ом.
+# Модуль не зависит от Django — его функции вызываются из пула процессов.
+
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+INFO_ID = 0x1549A966
+CLUSTER_ID = 0x1F43B675
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+
+MP4_TOP_LEVEL = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pdin', b'uuid'}
+
+# Сколько элементов верхнего уровня Segment просматривать до Info
+MAX_SEGMENT_CHILDREN = 64
+
+
+def _read_vint(file, keep_marker):
+    first = file.read(1)
+    if not first:
+        raise EOFError
+    byte = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not byte & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ValueError('Некорректный EBML vint')
+    value = byte if keep_marker else byte & (mask - 1)
+    unknown = not keep_marker and value == mask - 1
+    for extra in file.read(length - 1):
+        value = (value << 8) | extra
+        unknown = unknown and extra == 0xFF
+    return None if unknown else value
+
+
+def _mkv_duration(file):
+    file.seek(0)
+    if _read_vint(file, True) != EBML_ID:
+        return None
+    file.seek(_read_vint(file, False), os.SEEK_CUR)
+    if _read_vint(file, True) != SEGMENT_ID:
+        return None
+    _read_vint(file, False)  # размер Segment может быть «неизвестным»
+
+    for _ in range(MAX_SEGMENT_CHILDREN):
+        element_id = _read_vint(file, True)
+        size = _read_vint(file, False)
+        if element_id == INFO_ID and size is not None:
+            return _mkv_info_duration(file, file.tell() + size)
+        if element_id == CLUSTER_ID or size is None:
+            return None
+        file.seek(size, os.SEEK_CUR)
+    return None
+
+
+def _mkv_info_duration(file, end):
+    scale = 1_000_000  # наносекунд на тик по умолчанию
+    duration = None
+    while file.tell() < end:
+        element_id = _read_vint(file, True)
+        size = _read_vint(file, False)
+        data = file.read(size)
+        if element_id == TIMECODE_SCALE_ID:
+            scale = int.from_bytes(data, 'big')
+        elif element_id == DURATION_ID:
+            duration = struct.unpack('>f' if size == 4 else '>d', data)[0]
+    if duration is None:
+        return None
+    return duration * scale / 1e9
+
+
+def _mp4_boxes(file, start, end):
+    position = start
+    while position + 8 <= end:
+        file.seek(position)
+        size, box_type = struct.unpack('>I4s', file.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', file.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield box_type, position + header, position + size
+        position += size
+
+
+def _mp4_duration(file):
+    end = file.seek(0, os.SEEK_END)
+    for box_type, body, box_end in _mp4_boxes(file, 0, end):
+        if box_type != b'moov':
+            continue
+        for child_type, child_body, _ in _mp4_boxes(file, body, box_end):
+            if child_type != b'mvhd':
+                continue
+            file.seek(child_body)
+            version = file.read(4)[0]
+            if version == 1:
+                _, _, timescale, duration = struct.unpack('>QQIQ', file.read(28))
+                unknown = duration == 0xFFFFFFFFFFFFFFFF
+            else:
+                _, _, timescale, duration = struct.unpack('>IIII', file.read(16))
+                unknown = duration == 0xFFFFFFFF
+            if unknown or not timescale:
+                return None
+            return duration / timescale
+    return None
+
+
+def probe_duration(source):
+    """
+    Длительность видео (timedelta, округлённая до секунды) или None,
+    если контейнер не распознан. source — путь или открытый бинарный файл.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            return probe_duration(file)
+
+    source.seek(0)
+    head = source.read(12)
+    try:
+        if head[:4] == EBML_ID.to_bytes(4, 'big'):
+            seconds = _mkv_duration(source)
+        elif head[4:8] in MP4_TOP_LEVEL:
+            seconds = _mp4_duration(source)
+        else:
+            return None
+    except (EOFError, ValueError, struct.error, IndexError):
+        return None
+    finally:
+        source.seek(0)
+    if seconds is None:
+        return None
+    return timedelta(seconds=round(seconds))
+
+
+def probe_path_seconds(item):
+    # Для ProcessPoolExecutor: (pk, путь) -> (pk, секунды или None)
+    pk, path = item
+    try:
+        duration = probe_duration(path)
+    except OSError:
+        duration = None
+    return pk, None if duration is None else int(duration.total_seconds())
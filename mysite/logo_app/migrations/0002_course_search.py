@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from logo_app import search
+    search.create_search_table(schema_editor.connection)
+    Course = apps.get_model('logo_app', 'Course')
+    search.index_courses(Course.objects.all(), schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from logo_app import search
+    search.drop_search_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logo_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
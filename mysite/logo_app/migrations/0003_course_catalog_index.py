@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logo_app', '0002_course_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status_course', 'price'], name='logo_app_co_status__4b00c5_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.2 on 2026-10-18 19:25
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_stats(apps, schema_editor):
+    from logo_app.stats import rebuild_course_stats
+    rebuild_course_stats(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logo_app', '0003_course_catalog_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='logo_app.course')),
+                ('lessons_count', models.IntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+                ('favorites_count', models.IntegerField(default=0)),
+                ('purchases_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.2 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_rollups(apps, schema_editor):
+    from logo_app.rollup import rebuild_rollups
+    rebuild_rollups(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logo_app', '0006_media_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerStudentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paid_count', models.IntegerField(default=0)),
+                ('free_count', models.IntegerField(default=0)),
+                ('categories', models.JSONField(default=dict)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_rollups', to=settings.AUTH_USER_MODEL)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owner_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('owner', 'student')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 20:08
+
+import logo_app.storage
+from django.db import migrations, models
+
+
+# Только меняет хранилище поля; файлы уже загруженных видео переносит 0013_move_lesson_videos
+# (или manage.py cas_media --migrate, если медиа при миграции были недоступны).
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logo_app', '0009_newsletter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lesson',
+            name='video',
+            field=models.FileField(storage=logo_app.storage.protected_storage, upload_to='lesson_video/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+
+def move_videos(apps, schema_editor):
+    # 0010 перенесла Lesson.video в защищённое хранилище (PROTECTED_MEDIA_ROOT), но файлы
+    # существующих уроков остались в MEDIA_ROOT и без переноса отдавали бы 404.
+    # Копируем их в защищённое CAS-хранилище и переписываем имена; старые файлы из
+    # MEDIA_ROOT снимаются с учёта (CAS) или удаляются. Если медиа при миграции недоступны
+    # (не смонтирован том), то же делает позже manage.py cas_media --migrate.
+    Lesson = apps.get_model('logo_app', 'Lesson')
+    storage = Lesson._meta.get_field('video').storage
+    rows = (Lesson.objects.exclude(video='').exclude(video__startswith=storage.prefix + '/')
+            .values_list('pk', 'video'))
+    moved = set()
+    for pk, name in rows.iterator(chunk_size=500):
+        if storage.exists(name) or not default_storage.exists(name):
+            continue
+        with default_storage.open(name, 'rb') as file:
+            blob_name = storage.save(name, file)
+        Lesson.objects.filter(pk=pk).update(video=blob_name)
+        moved.add(name)
+    # Старые файлы — только после того, как все строки переписаны (файл может быть общим)
+    for name in moved:
+        default_storage.delete(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logo_app', '0012_user_import_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_videos, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,13 @@
+import uuid
+from datetime import timedelta
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+
+from .storage import protected_storage
+
 USER_ROLE = (
     ('Владелец', 'Владелец'),
     ('Студент', 'Студент')
@@ -18,7 +25,6 @@ class UserProfile(AbstractUser):
 from django.dispatch import receiver
 from django.urls import reverse
 from django_rest_passwordreset.signals import reset_password_token_created
-from django.core.mail import send_mail
 
 
 @receiver(reset_password_token_created)
@@ -28,7 +34,9 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
         reset_password_token.key
     )
 
-    send_mail(
+    # Письмо только ставится в очередь, отправит воркер send_queued_mail
+    from .mailqueue import enqueue_mail
+    enqueue_mail(
         # Subject
         "Password Reset for {title}".format(title="Some website title"),
         # Message
@@ -43,6 +51,10 @@ def password_reset_token_created(sender, instance, reset_password_token, *args,
 class RegisterEmail(models.Model):
     email = models.EmailField()
 
+    class Meta:
+        # Рассылка идёт по Lower(email): дедупликация без регистра и чекпоинт по ключу
+        indexes = [models.Index(Lower('email'), name='registeremail_email_lower')]
+
     def __str__(self):
         return self.email
 class Home(models.Model):
@@ -115,6 +127,17 @@ class Category(models.Model):
     def __str__(self):
         return self.category_name
 
+class CourseQuerySet(models.QuerySet):
+    def for_catalog(self, user=None):
+        # Количество уроков и длительность — из CourseStats (один JOIN),
+        # флаг избранного — подзапросом EXISTS, всё в одном запросе
+        queryset = self.select_related('stats')
+        if user is not None and user.is_authenticated:
+            favorites = Favorite.objects.filter(user_id=user.id, course=OuterRef('pk'))
+            return queryset.annotate(is_favorite_flag=Exists(favorites))
+        return queryset.annotate(is_favorite_flag=Value(False, output_field=models.BooleanField()))
+
+
 class Course(models.Model):
     owner = models.ForeignKey(UserProfile, related_name='courses', on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -130,6 +153,13 @@ class Course(models.Model):
     status_course = models.CharField(max_length=20, choices=[('Бесплатно', 'Бесплатно'), ('Платно', 'Платно')],
                                          default='Бесплатно')
 
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status_course', 'price']),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -137,7 +167,7 @@ class Course(models.Model):
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='course_lessons')
     title = models.CharField(max_length=100)
-    video = models.FileField(upload_to='lesson_video/')
+    video = models.FileField(upload_to='lesson_video/', storage=protected_storage)
     goal = models.CharField(max_length=100)
     video_time = models.DurationField()
     STATUS_LESSON = (
@@ -149,6 +179,45 @@ class Lesson(models.Model):
     views = models.PositiveIntegerField(default=0)
 
 
+class LessonUpload(models.Model):
+    # Сессия докачиваемой загрузки видео урока (logo_app.uploads)
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='lesson_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    lesson = models.OneToOneField(Lesson, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+
+class UserImportJob(models.Model):
+    """
+    Задание массового импорта пользователей (logo_app.userimport): /user/import/ сохраняет
+    файл и задание, выполняет воркер run_user_imports; report — ImportReport.as_dict() или ошибка задания.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'pending'),
+        ('running', 'running'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='user_import_jobs')
+    input_format = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    report = models.JSONField(null=True, blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_date'])]
+
+
 class CourseReview(models.Model):
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -190,3 +259,110 @@ class PurchasedCourse(models.Model):
     class Meta:
         unique_together = ('user', 'course')
 
+
+class CourseStats(models.Model):
+    """
+    Денормализованные агрегаты курса. Обновляются сигналами (logo_app.stats)
+    при сохранении/удалении уроков, отзывов, избранного и покупок;
+    пересборка и проверка расхождений — команда rebuild_course_stats.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    lessons_count = models.IntegerField(default=0)
+    total_duration = models.DurationField(default=timedelta)
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    favorites_count = models.IntegerField(default=0)
+    purchases_count = models.IntegerField(default=0)
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 2)
+
+    @property
+    def rating_histogram(self):
+        return {str(i): getattr(self, f'rating_{i}') for i in range(1, 6)}
+
+
+class MediaBlob(models.Model):
+    # Файл в хранилище logo_app.storage.ContentAddressedStorage и число ссылок на него
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class OwnerStudentRollup(models.Model):
+    """
+    Сводка покупок студента у владельца для /owners-with-students/.
+    Обновляется сигналами (logo_app.rollup) при покупке/удалении покупки и при смене
+    владельца, статуса или категории курса; пересборка — команда rebuild_owner_rollups.
+    """
+    owner = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='student_rollups')
+    student = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='owner_rollups')
+    paid_count = models.IntegerField(default=0)
+    free_count = models.IntegerField(default=0)
+    categories = models.JSONField(default=dict)  # {id категории: число покупок}
+
+    class Meta:
+        unique_together = ('owner', 'student')
+
+    def __str__(self):
+        return f'{self.owner} - {self.student}'
+
+
+class OutboundEmail(models.Model):
+    """
+    Очередь исходящих писем. Запрос только кладёт письмо сюда (logo_app.mailqueue),
+    отправляет воркер send_queued_mail — пачками через одно SMTP-соединение, с повторами.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'pending'),
+        ('sent', 'sent'),
+        ('failed', 'failed'),
+    )
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    sent_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)}'
+
+
+class NewsletterCampaign(models.Model):
+    """
+    Рассылка по RegisterEmail (команда send_newsletter). last_email — чекпоинт:
+    все адреса с Lower(email) <= last_email уже обработаны, прерванный запуск продолжается с него.
+    claim_token/claimed_until — захват запуском (logo_app.newsletter.claim_campaign).
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    last_email = models.CharField(max_length=254, blank=True)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.subject
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .mailqueue import enqueue_mail
+from .models import NewsletterCampaign, RegisterEmail
+
+logger = logging.getLogger(__name__)
+
+# Рассылка по подписчикам RegisterEmail. Адреса читаются потоком (iterator) в порядке
+# Lower(email), дубли без учёта регистра отбрасываются. Пачки отправляют потоки пула,
+# у каждого потока своё SMTP-соединение на весь запуск. Пачки принимаются по порядку,
+# после каждой в кампании сохраняется чекпоинт — прерванный запуск продолжится с него
+# (письма последней незавершённой пачки могут уйти повторно). Неотправленные адреса
+# уходят в очередь OutboundEmail, там их дошлёт send_queued_mail с повторами.
+# Запуск сначала захватывает кампанию условным UPDATE (claim_token + срок claimed_until,
+# продлевается каждым чекпоинтом), поэтому два запуска одной кампании не идут параллельно;
+# захват упавшего запуска освобождается сам по истечении NEWSLETTER_CLAIM_TIMEOUT.
+
+NEWSLETTER_THREADS = getattr(settings, 'NEWSLETTER_THREADS', 4)
+NEWSLETTER_CHUNK_SIZE = getattr(settings, 'NEWSLETTER_CHUNK_SIZE', 100)
+NEWSLETTER_CLAIM_TIMEOUT = getattr(settings, 'NEWSLETTER_CLAIM_TIMEOUT', 600)
+
+
+class CampaignUnavailable(Exception):
+    """Кампанию уже отправляет другой запуск или она завершена."""
+
+
+def _claim_expires():
+    return timezone.now() + timedelta(seconds=NEWSLETTER_CLAIM_TIMEOUT)
+
+
+def claim_campaign(campaign, force=False):
+    """
+    Захватывает кампанию для запуска и возвращает токен захвата. Завершённую кампанию
+    захватывает только с force — тогда она отправляется заново с начала.
+    """
+    token = uuid.uuid4().hex
+    campaigns = NewsletterCampaign.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=timezone.now()), pk=campaign.pk)
+    changes = {'claim_token': token, 'claimed_until': _claim_expires()}
+    if force:
+        changes.update(last_email='', finished_date=None)
+    else:
+        campaigns = campaigns.filter(finished_date__isnull=True)
+    claimed = campaigns.update(**changes)
+    campaign.refresh_from_db()
+    if not claimed:
+        if campaign.finished_date and not force:
+            raise CampaignUnavailable(f'Рассылка #{campaign.pk} уже завершена {campaign.finished_date:%Y-%m-%d %H:%M}')
+        raise CampaignUnavailable(f'Рассылку #{campaign.pk} уже отправляет другой запуск '
+                                  f'(захват до {campaign.claimed_until:%Y-%m-%d %H:%M:%S})')
+    return token
+
+
+def subscriber_chunks(after='', chunk_size=NEWSLETTER_CHUNK_SIZE):
+    """Пачки [(ключ, адрес), ...] уникальных подписчиков с ключом больше after."""
+    emails = (RegisterEmail.objects
+              .annotate(email_key=Lower('email'))
+              .filter(email_key__gt=after)
+              .order_by('email_key', 'pk')
+              .values_list('email_key', 'email'))
+    chunk, previous = [], None
+    for key, email in emails.iterator(chunk_size=max(chunk_size, 2000)):
+        if key == previous:
+            continue
+        previous = key
+        chunk.append((key, email))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _ConnectionPool:
+    # По одному SMTP-соединению на поток пула; закрываются все разом в конце запуска
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def get(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = get_connection()
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def reset(self):
+        # После ошибки соединение может быть в неопределённом состоянии — переоткроем
+        self._local.connection.close()
+
+    def close_all(self):
+        for connection in self._connections:
+            connection.close()
+
+
+def _send_chunk(pool, subject, body, from_email, chunk):
+    connection = pool.get()
+    sent, failed = 0, []
+    for _key, email in chunk:
+        message = EmailMessage(subject, body, from_email, [email], connection=connection)
+        try:
+            connection.open()  # no-op, если соединение уже открыто
+            message.send()
+        except Exception as error:
+            logger.warning('Рассылка: не удалось отправить на %s: %s', email, error)
+            failed.append(email)
+            pool.reset()
+            continue
+        sent += 1
+    return chunk[-1][0], sent, failed
+
+
+def run_campaign(campaign, threads=NEWSLETTER_THREADS, chunk_size=NEWSLETTER_CHUNK_SIZE, progress=None,
+                 force=False):
+    """
+    Отправляет кампанию, начиная с её чекпоинта. Возвращает (отправлено, ошибок, секунд)
+    за этот запуск; progress(campaign) вызывается после каждой принятой пачки.
+    CampaignUnavailable — кампанию отправляет другой запуск или она завершена (без force).
+    """
+    token = claim_campaign(campaign, force)
+    mine = NewsletterCampaign.objects.filter(pk=campaign.pk, claim_token=token)
+    from_email = settings.DEFAULT_FROM_EMAIL
+    pool = _ConnectionPool()
+    sent_total = failed_total = 0
+    started = time.monotonic()
+
+    def accept(future):
+        nonlocal sent_total, failed_total
+        last_key, sent, failed = future.result()
+        # Неотправленным — отдельные письма в очереди с повторами, чекпоинт идёт дальше
+        for email in failed:
+            enqueue_mail(campaign.subject, campaign.body, from_email, [email])
+        if not mine.update(
+            last_email=last_key,
+            sent_count=F('sent_count') + sent,
+            failed_count=F('failed_count') + len(failed),
+            claimed_until=_claim_expires(),
+        ):
+            raise CampaignUnavailable(f'Рассылка #{campaign.pk}: захват истёк и перешёл к другому запуску')
+        campaign.last_email = last_key
+        campaign.sent_count += sent
+        campaign.failed_count += len(failed)
+        sent_total += sent
+        failed_total += len(failed)
+        if progress:
+            progress(campaign)
+
+    executor = ThreadPoolExecutor(max_workers=threads)
+    finished = None
+    try:
+        # Окно ограничено: в памяти не больше 2 * threads пачек, чекпоинт двигается по порядку
+        pending = deque()
+        for chunk in subscriber_chunks(campaign.last_email, chunk_size):
+            pending.append(executor.submit(_send_chunk, pool, campaign.subject, campaign.body, from_email, chunk))
+            if len(pending) >= threads * 2:
+                accept(pending.popleft())
+        while pending:
+            accept(pending.popleft())
+        finished = timezone.now()
+    finally:
+        # При прерывании не начатые пачки отменяются, начатые досылаются (после resume уйдут повторно)
+        executor.shutdown(wait=True, cancel_futures=True)
+        pool.close_all()
+        # Захват освобождается сразу: прерванный запуск можно продолжить, не дожидаясь его срока
+        mine.update(claim_token='', claimed_until=None, finished_date=finished)
+
+    campaign.finished_date = finished
+    return sent_total, failed_total, time.monotonic() - started
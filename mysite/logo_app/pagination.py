@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация по первичному ключу:
+    WHERE id > <курсор> ORDER BY id LIMIT n — без OFFSET, время ответа
+    не растёт вместе с таблицей.
+    """
+    ordering = 'id'
+    page_size = getattr(settings, 'PAGE_SIZE', 20)
+    page_size_query_param = 'limit'
+    max_page_size = getattr(settings, 'MAX_PAGE_SIZE', 100)
+
@@ -1,23 +1,20 @@
 from rest_framework import permissions
 
+from . import access
+from .authentication import profile_of
+
 class UserEdit(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        if obj.id == request.user.id:
-            return True
-        return False
+        return access.is_self(request.user, obj)
 
 
 class CheckUserOwner(permissions.BasePermission):
     def has_permission(self, request, view):
-        if request.user.role == 'Владелец':
-            return True
-        return False
+        return access.has_role(request.user, 'Владелец')
 
 class CheckUserStudent(permissions.BasePermission):
     def has_permission(self, request, view):
-        if request.user.role == 'Студент':
-            return True
-        return False
+        return access.has_role(request.user, 'Студент')
 
 
 class IsLessonOpen(permissions.BasePermission):
@@ -25,7 +22,7 @@ class IsLessonOpen(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # obj — это экземпляр Lesson
-        return obj.status == 'Открытый'
+        return access.lesson_is_open(obj)
 
 class IsSelfOrCourseOwner(permissions.BasePermission):
     """
@@ -37,14 +34,13 @@ class IsSelfOrCourseOwner(permissions.BasePermission):
     message = "Доступ разрешён только владельцу профиля или владельцу курса."
 
     def has_object_permission(self, request, view, obj):
-        # 1) Сам себе
-        if request.user == obj:
+        if access.is_self(request.user, obj):
             return True
+        # Один EXISTS вместо обхода покупок (logo_app.access)
+        return request.user.is_authenticated and access.has_bought_from(request, obj.pk, request.user.pk)
 
-        # 2) Проверяем, купил ли obj курс у request.user
-        #    purchased_courses — related_name модели PurchasedCourse у UserProfile
-        for purchase in obj.purchased_courses.all():
-            if purchase.course.owner == request.user:
-                return True
 
-        return False
\ No newline at end of file
+class IsStaff(permissions.BasePermission):
+    # В access-токене нет is_staff — для служебных эндпоинтов читаем пользователя из БД
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and profile_of(request.user).is_staff
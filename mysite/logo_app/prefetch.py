@@ -0,0 +1,111 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet
+from rest_framework import serializers
+
+# План select_related/prefetch_related по дереву полей сериализатора.
+# Вложенный сериализатор на прямом FK/OneToOne (и обратном OneToOne) — JOIN через select_related,
+# на обратном FK/ManyToMany — отдельный запрос через Prefetch, в котором выбираются
+# только колонки, нужные вложенному сериализатору (плюс FK для связывания).
+
+
+class Plan:
+    __slots__ = ('select', 'prefetch', 'columns')
+
+    def __init__(self, select, prefetch, columns):
+        self.select = select        # пути для select_related
+        self.prefetch = prefetch    # (путь, модель, Plan) для Prefetch
+        self.columns = columns      # поля для only() или None, если сузить нельзя
+
+
+def _nested(field):
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+def _build(serializer, model):
+    select, prefetch, columns = [], [], {model._meta.pk.name}
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or len(field.source_attrs) != 1:
+            # SerializerMethodField и составные source — какие колонки нужны, неизвестно
+            columns = None
+            continue
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            if not hasattr(model, field.source_attrs[0]):
+                continue  # поле не резолвится — DRF его всё равно пропустит
+            columns = None  # свойство модели
+            continue
+
+        nested = _nested(field)
+        if nested is None or not model_field.is_relation:
+            if columns is not None and model_field.concrete:
+                columns.add(model_field.name)
+            continue
+
+        name = model_field.name
+        child = plan_for(type(nested), model_field.related_model)
+        if model_field.many_to_one or model_field.one_to_one:
+            select.append(name)
+            select.extend(f'{name}__{path}' for path in child.select)
+            prefetch.extend((f'{name}__{path}', related, plan) for path, related, plan in child.prefetch)
+            if columns is not None and child.columns is not None:
+                if model_field.concrete:
+                    columns.add(name)
+                columns.update(f'{name}__{column}' for column in child.columns)
+            else:
+                columns = None
+        else:
+            if model_field.one_to_many and child.columns is not None:
+                # Без FK на родителя Django не сможет разложить строки по объектам
+                child = Plan(child.select, child.prefetch, child.columns | {model_field.field.name})
+            prefetch.append((name, model_field.related_model, child))
+    return Plan(tuple(select), tuple(prefetch), frozenset(columns) if columns is not None else None)
+
+
+@lru_cache(maxsize=None)
+def plan_for(serializer_class, model):
+    return _build(serializer_class(), model)
+
+
+def _prefetch_objects(prefetch):
+    for path, model, plan in prefetch:
+        queryset = model._default_manager.all()
+        if plan.select:
+            queryset = queryset.select_related(*plan.select)
+        if plan.prefetch:
+            queryset = queryset.prefetch_related(*_prefetch_objects(plan.prefetch))
+        if plan.columns is not None:
+            queryset = queryset.only(*plan.columns)
+        yield Prefetch(path, queryset=queryset)
+
+
+def apply_prefetch_plan(queryset, serializer_class):
+    """select_related/prefetch_related для queryset по полям serializer_class."""
+    plan = plan_for(serializer_class, queryset.model)
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*_prefetch_objects(plan.prefetch))
+    return queryset
+
+
+class PrefetchPlanMixin:
+    """
+    Для generic-представлений: дополняет queryset планом из сериализатора.
+    План накладывается в filter_queryset(), поэтому работает и для представлений,
+    которые переопределяют get_queryset() без super(); list() и get_object() проходят через него.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if isinstance(queryset, QuerySet):
+            queryset = apply_prefetch_plan(queryset, self.get_serializer_class())
+        return queryset
@@ -0,0 +1,94 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from .models import Home, WhyCourse, AboutUs, TitleCourse, Category
+from .serializers import HomeSerializers, WhyCourseSerializer, AboutUsSerializer, TitleCourseSerializer, CategorySerializer
+from .prefetch import apply_prefetch_plan
+
+logger = logging.getLogger(__name__)
+
+# Редко меняющийся публичный контент, заранее отрендеренный в JSON.
+# Файлы <имя>.<хэш>.json лежат в PUBLIC_API_ROOT и отдаются nginx'ом напрямую;
+# manifest.json сообщает фронтенду актуальные имена.
+
+PUBLIC_API_ROOT = getattr(settings, 'PUBLIC_API_ROOT', os.path.join(settings.STATIC_ROOT, 'public_api'))
+MANIFEST_NAME = 'manifest.json'
+
+PUBLIC_API_EXPORTS = (
+    ('home', Home, HomeSerializers),
+    ('whycourse', WhyCourse, WhyCourseSerializer),
+    ('aboutus', AboutUs, AboutUsSerializer),
+    ('titlecourse', TitleCourse, TitleCourseSerializer),
+    ('categories', Category, CategorySerializer),
+)
+
+
+def render_export(model, serializer_class):
+    # Без request картинки получают относительные URL (/media/...) — тот же хост, что и у nginx
+    queryset = apply_prefetch_plan(model.objects.all(), serializer_class)
+    return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+
+def _write_atomic(path, content):
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+def _read_manifest():
+    try:
+        with open(os.path.join(PUBLIC_API_ROOT, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_public_api():
+    """
+    Рендерит все выгрузки и обновляет манифест. Рендерим всё каждый раз: запросов мало,
+    а манифест тогда целиком вычисляется из БД и параллельные сохранения не затирают друг друга.
+    Возвращает новый манифест.
+    """
+    os.makedirs(PUBLIC_API_ROOT, exist_ok=True)
+    previous = _read_manifest()
+    manifest = {}
+    for name, model, serializer_class in PUBLIC_API_EXPORTS:
+        content = render_export(model, serializer_class)
+        filename = f'{name}.{hashlib.sha256(content).hexdigest()[:12]}.json'
+        path = os.path.join(PUBLIC_API_ROOT, filename)
+        if not os.path.exists(path):
+            _write_atomic(path, content)
+        manifest[name] = filename
+    _write_atomic(os.path.join(PUBLIC_API_ROOT, MANIFEST_NAME),
+                  json.dumps(manifest, ensure_ascii=False, indent=2).encode())
+
+    # Предыдущую версию оставляем для клиентов со старым манифестом, более старые удаляем
+    keep = set(manifest.values()) | set(previous.values())
+    for name, _, _ in PUBLIC_API_EXPORTS:
+        for path in glob.glob(os.path.join(PUBLIC_API_ROOT, f'{name}.*.json')):
+            if os.path.basename(path) not in keep:
+                os.remove(path)
+    return manifest
+
+
+def export_public_api_safe():
+    # Для хуков админки: ошибка выгрузки не должна ронять уже сохранённую форму
+    try:
+        export_public_api()
+    except Exception:
+        logger.exception('Не удалось выгрузить публичный JSON')
+
+
+def schedule_export(using=None):
+    # Выгрузка — после коммита и один раз на транзакцию, сколько бы объектов ни сохранила админка
+    connection = transaction.get_connection(using)
+    if not any(callback is export_public_api_safe for _, callback, _ in connection.run_on_commit):
+        transaction.on_commit(export_public_api_safe, using=using)
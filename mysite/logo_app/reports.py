@@ -0,0 +1,42 @@
+from collections import defaultdict
+
+from .models import UserProfile, Category, OwnerStudentRollup
+
+# Отчёт «владельцы и их студенты» из сводки OwnerStudentRollup (logo_app.rollup):
+# строки читаются по индексу (owner, student), сериализаторы получают готовые множества.
+
+
+class OwnerStudents:
+    __slots__ = ('students', 'paid', 'free', 'categories')
+
+    def __init__(self):
+        self.students = {}                        # id студента -> UserProfile
+        self.paid = set()                         # купили хотя бы один платный курс владельца
+        self.free = set()                         # ... хотя бы один бесплатный
+        self.categories = defaultdict(dict)       # id студента -> {id категории: Category}
+
+    def students_in(self, ids):
+        return [self.students[pk] for pk in sorted(ids)]
+
+
+def owner_students_report(owner_ids):
+    """{id владельца: OwnerStudents} для студентов, купивших курсы этих владельцев."""
+    report = defaultdict(OwnerStudents)
+    rows = list(OwnerStudentRollup.objects
+                .filter(owner_id__in=owner_ids, student__role='Студент')
+                .order_by('owner_id', 'student_id')
+                .values_list('owner_id', 'student_id', 'student__username', 'student__avatar',
+                             'paid_count', 'free_count', 'categories'))
+    category_ids = {int(pk) for *_, categories in rows for pk in categories}
+    category_names = dict(Category.objects.filter(pk__in=category_ids).values_list('id', 'category_name'))
+
+    for owner_id, user_id, username, avatar, paid_count, free_count, categories in rows:
+        owner = report[owner_id]
+        owner.students[user_id] = UserProfile(id=user_id, username=username, avatar=avatar)
+        if paid_count:
+            owner.paid.add(user_id)
+        if free_count:
+            owner.free.add(user_id)
+        for category_id in map(int, categories):
+            owner.categories[user_id][category_id] = Category(id=category_id, category_name=category_names.get(category_id))
+    return report
@@ -0,0 +1,174 @@
+import threading
+from collections import Counter
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import OwnerStudentRollup, PurchasedCourse
+
+# Сводка OwnerStudentRollup: строка на пару (владелец, студент) со счётчиками
+# платных/бесплатных покупок и числом покупок по категориям.
+# Состояние курса для сводки — (owner_id, status_course, category_id).
+
+PAID = 'Платно'
+FREE = 'Бесплатно'
+
+# Курсы, удаляемые в этом потоке: их вклад снят целиком в pre_delete,
+# post_delete каскадно удаляемых покупок сводку уже не трогает.
+# Если удаление откатится, отметка останется до следующего удаления курса — расхождение покажет find_rollup_drift
+_deleting = threading.local()
+
+
+def course_state(course):
+    return course.owner_id, course.status_course, course.category_id
+
+
+def apply_purchase(state, student_id, sign):
+    """Добавляет (sign=1) или вычитает (sign=-1) одну покупку курса в состоянии state."""
+    owner_id, status, category_id = state
+    with transaction.atomic():
+        rows = OwnerStudentRollup.objects.select_for_update()
+        if sign > 0:
+            row, _ = rows.get_or_create(owner_id=owner_id, student_id=student_id)
+        else:
+            row = rows.filter(owner_id=owner_id, student_id=student_id).first()
+            if row is None:
+                return  # строка уже удалена каскадом вместе с пользователем
+        if status == PAID:
+            row.paid_count += sign
+        elif status == FREE:
+            row.free_count += sign
+        key = str(category_id)
+        count = row.categories.get(key, 0) + sign
+        if count > 0:
+            row.categories[key] = count
+        else:
+            row.categories.pop(key, None)
+
+        if row.paid_count + row.free_count <= 0:
+            row.delete()
+        else:
+            row.save()
+
+
+def _count_delta(status, sign):
+    if status == PAID:
+        return {'paid_count': F('paid_count') + sign}
+    if status == FREE:
+        return {'free_count': F('free_count') + sign}
+    return {}
+
+
+def _shift_course(course_id, state, sign):
+    """apply_purchase(state, студент, sign) сразу для всех студентов курса — набором запросов."""
+    owner_id, status, category_id = state
+    students = PurchasedCourse.objects.filter(course_id=course_id).values('user_id')
+    rows = OwnerStudentRollup.objects.filter(owner_id=owner_id, student_id__in=students)
+    if sign > 0:
+        missing = (PurchasedCourse.objects.filter(course_id=course_id)
+                   .exclude(user_id__in=OwnerStudentRollup.objects.filter(owner_id=owner_id).values('student_id'))
+                   .values_list('user_id', flat=True))
+        OwnerStudentRollup.objects.bulk_create(
+            [OwnerStudentRollup(owner_id=owner_id, student_id=student_id) for student_id in missing],
+            batch_size=500, ignore_conflicts=True,
+        )
+    # Блокируем строки (в порядке pk, как и apply_purchase — по одной) и читаем categories:
+    # это JSON, его меняем в Python и пишем одним bulk_update, счётчики — одним UPDATE через F()
+    locked = list(rows.select_for_update().order_by('pk').only('pk', 'categories'))
+    delta = _count_delta(status, sign)
+    if delta:
+        rows.update(**delta)
+    key = str(category_id)
+    for row in locked:
+        count = row.categories.get(key, 0) + sign
+        if count > 0:
+            row.categories[key] = count
+        else:
+            row.categories.pop(key, None)
+    OwnerStudentRollup.objects.bulk_update(locked, ['categories'], batch_size=500)
+
+
+def move_course(course_id, old_state, new_state):
+    """
+    Курс сменил владельца/статус/категорию — переносим покупки всех его студентов.
+    Число запросов не зависит от числа покупателей; пустые строки удаляются в конце,
+    чтобы при смене только статуса/категории строка не пропала между вычитанием и добавлением.
+    """
+    with transaction.atomic():
+        _shift_course(course_id, old_state, -1)
+        _shift_course(course_id, new_state, 1)
+        _delete_empty(course_id, {old_state[0], new_state[0]})
+
+
+def _delete_empty(course_id, owner_ids):
+    students = PurchasedCourse.objects.filter(course_id=course_id).values('user_id')
+    (OwnerStudentRollup.objects
+     .filter(owner_id__in=owner_ids, student_id__in=students)
+     .alias(total=F('paid_count') + F('free_count'))
+     .filter(total__lte=0)
+     .delete())
+
+
+def deleting_courses():
+    if not hasattr(_deleting, 'course_ids'):
+        _deleting.course_ids = set()
+    return _deleting.course_ids
+
+
+def remove_course(course_id, state):
+    """
+    Курс удаляется: вычитаем покупки всех его студентов теми же групповыми запросами, что и move_course.
+    Вызывается в pre_delete, пока покупки ещё в базе; их post_delete пропускается до course_deleted.
+    """
+    with transaction.atomic():
+        _shift_course(course_id, state, -1)
+        _delete_empty(course_id, {state[0]})
+    deleting_courses().add(course_id)
+
+
+def course_deleted(course_id):
+    deleting_courses().discard(course_id)
+
+
+def compute_rollups(apps=global_apps):
+    """{(owner_id, student_id): поля сводки} с нуля — одним GROUP BY по покупкам."""
+    PurchasedCourse = apps.get_model('logo_app', 'PurchasedCourse')
+    rows = (PurchasedCourse.objects.order_by()
+            .values('course__owner_id', 'user_id', 'course__status_course', 'course__category_id')
+            .annotate(count=Count('id')))
+    result = {}
+    for row in rows:
+        key = (row['course__owner_id'], row['user_id'])
+        values = result.setdefault(key, {'paid_count': 0, 'free_count': 0, 'categories': Counter()})
+        if row['course__status_course'] == PAID:
+            values['paid_count'] += row['count']
+        elif row['course__status_course'] == FREE:
+            values['free_count'] += row['count']
+        values['categories'][str(row['course__category_id'])] += row['count']
+    for values in result.values():
+        values['categories'] = dict(values['categories'])
+    return result
+
+
+def find_rollup_drift(apps=global_apps):
+    """{(owner_id, student_id): (сохранено, должно быть)} для расходящихся строк."""
+    Rollup = apps.get_model('logo_app', 'OwnerStudentRollup')
+    expected = compute_rollups(apps)
+    stored = {(row.pop('owner_id'), row.pop('student_id')): row for row in
+              Rollup.objects.values('owner_id', 'student_id', 'paid_count', 'free_count', 'categories')}
+    return {key: (stored.get(key), expected.get(key))
+            for key in stored.keys() | expected.keys() if stored.get(key) != expected.get(key)}
+
+
+def rebuild_rollups(apps=global_apps):
+    Rollup = apps.get_model('logo_app', 'OwnerStudentRollup')
+    expected = compute_rollups(apps)
+    with transaction.atomic():
+        Rollup.objects.all().delete()
+        Rollup.objects.bulk_create(
+            [Rollup(owner_id=owner_id, student_id=student_id, **values)
+             for (owner_id, student_id), values in expected.items()],
+            batch_size=500,
+        )
+    return len(expected)
@@ -0,0 +1,240 @@
+import re
+
+from django.db import connection as default_connection
+from django.db.models import Q
+
+# Полнотекстовый поиск по курсам.
+# SQLite — виртуальная таблица FTS5 (rowid = id курса), в неё пишем уже
+# застемленный текст; PostgreSQL — tsvector с GIN-индексом и словарём russian.
+
+SEARCH_TABLE = 'logo_app_course_search'
+SEARCH_LIMIT = 50
+
+# Веса колонок: title, category_name, brief_description, description
+SEARCH_COLUMNS = ('title', 'category_name', 'brief_description', 'description')
+_FTS5_WEIGHTS = '10.0, 5.0, 3.0, 1.0'
+_PG_WEIGHTS = ('A', 'B', 'C', 'D')
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# --- Стеммер (русский Snowball) ----------------------------------------------
+
+_VOWELS = 'аеиоуыэюя'
+
+# (окончания после «а»/«я», обычные окончания)
+_PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                      ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+_ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+                   'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+_PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+_REFLEXIVE = ((), ('ся', 'сь'))
+_VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть',
+          'ешь', 'нно'),
+         ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым',
+          'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую',
+          'ю'))
+_NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей',
+              'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы',
+              'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'))
+_SUPERLATIVE = ('ейше', 'ейш')
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _regions(word):
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in _VOWELS and word[i] not in _VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in _VOWELS and word[i] not in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _cut(word, endings):
+    # Самое длинное подходящее окончание; окончания первой группы
+    # отрезаются только после «а» или «я»
+    after_a, plain = endings
+    best = max((e for e in after_a + plain if word.endswith(e)), key=len, default=None)
+    if best is None:
+        return None
+    if best in after_a:
+        if len(word) > len(best) and word[-len(best) - 1] in 'ая':
+            return word[:-len(best)]
+        return None
+    return word[:-len(best)]
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    prefix, rest = word[:rv], word[rv:]
+    r2 = max(r2 - rv, 0)
+
+    # Шаг 1
+    cut = _cut(rest, _PERFECTIVE_GERUND)
+    if cut is not None:
+        rest = cut
+    else:
+        cut = _cut(rest, _REFLEXIVE)
+        if cut is not None:
+            rest = cut
+        cut = _cut(rest, _ADJECTIVE)
+        if cut is not None:
+            rest = cut
+            cut = _cut(rest, _PARTICIPLE)
+            if cut is not None:
+                rest = cut
+        else:
+            cut = _cut(rest, _VERB)
+            if cut is None:
+                cut = _cut(rest, _NOUN)
+            if cut is not None:
+                rest = cut
+
+    # Шаг 2
+    if rest.endswith('и'):
+        rest = rest[:-1]
+
+    # Шаг 3
+    for ending in _DERIVATIONAL:
+        if rest.endswith(ending) and len(rest) - len(ending) >= r2:
+            rest = rest[:-len(ending)]
+            break
+
+    # Шаг 4
+    superlative = next((e for e in _SUPERLATIVE if rest.endswith(e)), None)
+    if superlative:
+        rest = rest[:-len(superlative)]
+    if rest.endswith('нн'):
+        rest = rest[:-1]
+    elif not superlative and rest.endswith('ь'):
+        rest = rest[:-1]
+
+    return prefix + rest
+
+
+def stem_text(text):
+    return ' '.join(stem(word) for word in _WORD_RE.findall(text or ''))
+
+
+# --- Индекс -------------------------------------------------------------------
+
+def _vendor(connection):
+    return connection.vendor
+
+
+def create_search_table(connection=default_connection):
+    with connection.cursor() as cursor:
+        if _vendor(connection) == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                f"{', '.join(SEARCH_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+            )
+        elif _vendor(connection) == 'postgresql':
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"course_id bigint PRIMARY KEY REFERENCES logo_app_course(id) ON DELETE CASCADE, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+                f"ON {SEARCH_TABLE} USING GIN (document)"
+            )
+
+
+def drop_search_table(connection=default_connection):
+    if _vendor(connection) in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def _documents(courses):
+    for course in courses.values('id', 'title', 'brief_description', 'description',
+                                 'category__category_name'):
+        yield course['id'], (course['title'], course['category__category_name'],
+                             course['brief_description'], course['description'])
+
+
+def index_courses(courses, connection=default_connection):
+    """Переиндексирует курсы из queryset (подходит и для исторических моделей миграций)."""
+    vendor = _vendor(connection)
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+    with connection.cursor() as cursor:
+        for course_id, values in _documents(courses):
+            if vendor == 'sqlite':
+                cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [course_id])
+                cursor.execute(
+                    f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+                    f"VALUES (%s, %s, %s, %s, %s)",
+                    [course_id, *(stem_text(value) for value in values)],
+                )
+            else:
+                document = ' || '.join(
+                    f"setweight(to_tsvector('russian', coalesce(%s, '')), '{weight}')"
+                    for weight in _PG_WEIGHTS
+                )
+                cursor.execute(
+                    f"INSERT INTO {SEARCH_TABLE} (course_id, document) VALUES (%s, {document}) "
+                    f"ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document",
+                    [course_id, *values],
+                )
+
+
+def remove_course(course_id, connection=default_connection):
+    # В PostgreSQL строку удалит ON DELETE CASCADE
+    if _vendor(connection) == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [course_id])
+
+
+def rebuild_index(courses, connection=default_connection):
+    with connection.cursor() as cursor:
+        if _vendor(connection) in ('sqlite', 'postgresql'):
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    index_courses(courses, connection)
+
+
+def _fts5_query(query):
+    # Каждое слово — застемленный префикс в кавычках, слова через AND
+    terms = [stem(word) for word in _WORD_RE.findall(query)]
+    return ' '.join(f'"{term}"*' for term in terms if term)
+
+
+def search_course_ids(query, limit=SEARCH_LIMIT, connection=default_connection):
+    """Возвращает id курсов, отсортированные по релевантности (не больше limit)."""
+    vendor = _vendor(connection)
+    if vendor == 'sqlite':
+        match = _fts5_query(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"ORDER BY bm25({SEARCH_TABLE}, {_FTS5_WEIGHTS}) LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    if vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT course_id FROM {SEARCH_TABLE}, websearch_to_tsquery('russian', %s) query "
+                f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC, course_id LIMIT %s",
+                [query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    # Прочие СУБД — без индекса, простым icontains
+    from .models import Course
+    condition = Q()
+    for field in ('title', 'brief_description', 'description', 'category__category_name'):
+        condition |= Q(**{f'{field}__icontains': query})
+    return list(Course.objects.filter(condition).order_by('id').values_list('id', flat=True)[:limit])
@@ -1,6 +1,14 @@
+import os
+from django.conf import settings
+from django.db import transaction
 from .models import *
+from .media_probe import probe_duration
+from .fields import LessonVideoField, ResponsiveImageModelSerializer
+from .reports import OwnerStudents
+from .authentication import tokens_for_user
+from .tokens import CachedBlacklistRefreshToken
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth import authenticate
 from datetime import timedelta
 from django.contrib.auth import get_user_model
@@ -49,7 +57,7 @@ class CustomLoginSerializer(serializers.Serializer):
 
     def to_representation(self, instance):
         user = self.context['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
 
         return {
             'user': {
@@ -61,6 +69,11 @@ class CustomLoginSerializer(serializers.Serializer):
         }
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    # Проверка чёрного списка через фильтр Блума (logo_app.tokens)
+    token_class = CachedBlacklistRefreshToken
+
+
 class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField()
 
@@ -69,17 +82,17 @@ class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
 
-class UserProfileSimpleSerializer(serializers.ModelSerializer):
+class UserProfileSimpleSerializer(ResponsiveImageModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['username', 'avatar']
 
-class UserProfileDetailSerializer(serializers.ModelSerializer):
+class UserProfileDetailSerializer(ResponsiveImageModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['id', 'username', 'avatar', 'email']
 
-class HighlightSerializer(serializers.ModelSerializer):
+class HighlightSerializer(ResponsiveImageModelSerializer):
     class Meta:
         model = Highlight
         fields = ['id', 'home', 'icon', 'description']
@@ -90,7 +103,7 @@ class HomeSerializers(serializers.ModelSerializer):
         model = Home
         fields = ['id', 'title', 'description', 'image', 'highlight']
 
-class WhyCourseHighlightSerializer(serializers.ModelSerializer):
+class WhyCourseHighlightSerializer(ResponsiveImageModelSerializer):
     class Meta:
         model = WhyCourseHighlight
         fields = ['id', 'highlight_title', 'highlight_icon', 'highlight_description']
@@ -118,7 +131,7 @@ class EmailTitleSerializer(serializers.ModelSerializer):
         model = EmailTitle
         fields = '__all__'
 
-class AboutUsImageSerializer(serializers.ModelSerializer):
+class AboutUsImageSerializer(ResponsiveImageModelSerializer):
     class Meta:
         model = AboutUsImage
         fields = ['id', 'image']
@@ -138,11 +151,15 @@ class TitleCourseSerializer(serializers.ModelSerializer):
 
 
 class LessonListSerializer(serializers.ModelSerializer):
+    video = LessonVideoField(read_only=True)
+
     class Meta:
         model = Lesson
         fields = ['id', 'title', 'video', 'goal', 'video_time', 'status']
 
 class LessonDetailSerializer(serializers.ModelSerializer):
+    video = LessonVideoField(read_only=True)
+
     class Meta:
         model = Lesson
         fields = ['id', 'title', 'video', 'goal', 'video_time', 'status', 'created_date', 'views']
@@ -152,14 +169,25 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'category_name']
 
+class CourseStatsSerializer(serializers.ModelSerializer):
+    average_rating = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = CourseStats
+        fields = ['lessons_count', 'total_duration', 'average_rating', 'rating_count', 'rating_histogram',
+                  'favorites_count', 'purchases_count']
+
+
 class CourseDetailSerializer(serializers.ModelSerializer):
     course_lessons = LessonListSerializer(many=True, read_only=True)
     category = CategorySerializer()
+    stats = CourseStatsSerializer(read_only=True)
     class Meta:
          model = Course
-         fields = ['id', 'category', 'title', 'description', 'course_lessons']
+         fields = ['id', 'category', 'title', 'description', 'course_lessons', 'stats']
 
-class CourseListSerializer(serializers.ModelSerializer):
+class CourseListSerializer(ResponsiveImageModelSerializer):
     total_duration = serializers.SerializerMethodField()
     lessons_count = serializers.SerializerMethodField()
     is_favorite = serializers.SerializerMethodField()
@@ -168,17 +196,32 @@ class CourseListSerializer(serializers.ModelSerializer):
         model = Course
         fields = ['id', 'title', 'brief_description', 'image', 'price', 'status_course', 'time_image', 'total_duration', 'lesson_image', 'lessons_count', 'progress_image', 'progress', 'is_favorite']
 
+    def _stats(self, obj):
+        # CourseStats подтягивается JOIN'ом в Course.objects.for_catalog()
+        try:
+            return obj.stats
+        except CourseStats.DoesNotExist:
+            return None
+
     def get_total_duration(self, obj):
+        stats = self._stats(obj)
+        if stats is not None:
+            return str(stats.total_duration)
         total = sum((lesson.video_time for lesson in obj.course_lessons.all()), timedelta())
         return str(total)
 
     def get_lessons_count(self, obj):
+        stats = self._stats(obj)
+        if stats is not None:
+            return f'{stats.lessons_count} уроков'
         return f'{obj.course_lessons.count()} уроков'
 
     def get_is_favorite(self, obj):
+        if hasattr(obj, 'is_favorite_flag'):
+            return obj.is_favorite_flag
         user = self.context.get('request').user
         if user.is_authenticated:
-            return Favorite.objects.filter(user=user, course=obj).exists()
+            return Favorite.objects.filter(user_id=user.pk, course=obj).exists()
         return False
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -189,7 +232,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         request = self.context.get('request')
-        validated_data['user'] = request.user
+        validated_data['user_id'] = request.user.pk
         return super().create(validated_data)
 
 class FavoriteListSerializer(serializers.ModelSerializer):
@@ -205,13 +248,15 @@ class PurchaseCourseSerializer(serializers.ModelSerializer):
     def validate(self, data):
         user = self.context['request'].user
         course = data['course']
-        if PurchasedCourse.objects.filter(user=user, course=course).exists():
+        if PurchasedCourse.objects.filter(user_id=user.pk, course=course).exists():
             raise serializers.ValidationError("Курс уже куплен")
         return data
 
     def create(self, validated_data):
         user = self.context['request'].user
-        return PurchasedCourse.objects.create(user=user, **validated_data)
+        # Покупка и обновление сводок (сигналы) — одной транзакцией
+        with transaction.atomic():
+            return PurchasedCourse.objects.create(user_id=user.pk, **validated_data)
 
 class UserProfileListSerializer(serializers.ModelSerializer):
     favorites = FavoriteSerializer(many=True, read_only=True)
@@ -266,10 +311,9 @@ class StudentWithCategoriesSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'avatar', 'categories']
 
     def get_categories(self, obj):
-        owner = self.context.get('owner')
-        purchased_courses = obj.purchased_courses.filter(course__owner=owner).select_related('course__category')
-        categories = set(purchase.course.category for purchase in purchased_courses)
-        return CategorySerializer(categories, many=True).data
+        # Категории курсов владельца, купленных студентом, — из reports.owner_students_report
+        categories = self.context['categories'].get(obj.pk, {})
+        return CategorySerializer(sorted(categories.values(), key=lambda category: category.pk), many=True).data
 
 
 # class OwnerWithStudentsSerializer(serializers.ModelSerializer):
@@ -300,26 +344,21 @@ class OwnerWithStudentsFullSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = ['id', 'username', 'avatar', 'students_paid', 'students_free', 'students_both']
 
-    def _get_students_by_course_status(self, obj, status):
-        return UserProfile.objects.filter(
-            role='Студент',
-            purchased_courses__course__owner=obj,
-            purchased_courses__course__status_course=status
-        ).distinct()
+    # context['students_report'] — {id владельца: OwnerStudents}, см. reports.owner_students_report
+
+    def _students(self, obj, ids_of):
+        report = self.context['students_report'].get(obj.pk) or OwnerStudents()
+        students = report.students_in(ids_of(report))
+        return StudentWithCategoriesSerializer(students, many=True, context={'categories': report.categories}).data
 
     def get_students_paid(self, obj):
-        qs = self._get_students_by_course_status(obj, 'Платно')
-        return StudentWithCategoriesSerializer(qs, many=True, context={'owner': obj}).data
+        return self._students(obj, lambda report: report.paid)
 
     def get_students_free(self, obj):
-        qs = self._get_students_by_course_status(obj, 'Бесплатно')
-        return StudentWithCategoriesSerializer(qs, many=True, context={'owner': obj}).data
+        return self._students(obj, lambda report: report.free)
 
     def get_students_both(self, obj):
-        paid = self._get_students_by_course_status(obj, 'Платно')
-        free = self._get_students_by_course_status(obj, 'Бесплатно')
-        both = paid & free  # пересечение QuerySet'ов
-        return StudentWithCategoriesSerializer(both, many=True, context={'owner': obj}).data
+        return self._students(obj, lambda report: report.paid & report.free)
 
 class OwnerListSerializer(serializers.ModelSerializer):
     class Meta:
@@ -332,6 +371,51 @@ class CourseCreateSerializers(serializers.ModelSerializer):
         fields = '__all__'
 
 class LessonCreateSerializer(serializers.ModelSerializer):
+    video = LessonVideoField()
+
     class Meta:
         model = Lesson
         fields = '__all__'
+        extra_kwargs = {'video_time': {'required': False}}
+
+    def validate(self, data):
+        # video_time не передан — берём длительность из заголовков контейнера
+        video = data.get('video')
+        if video and not data.get('video_time'):
+            duration = probe_duration(video)
+            if duration is None:
+                raise serializers.ValidationError(
+                    {'video_time': 'Не удалось определить длительность видео, укажите её вручную.'})
+            data['video_time'] = duration
+        elif not self.instance and not data.get('video_time'):
+            raise serializers.ValidationError({'video_time': 'Обязательное поле.'})
+        return data
+
+
+class LessonUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LessonUpload
+        fields = ['id', 'filename', 'size', 'offset', 'lesson', 'created_date']
+        read_only_fields = ['offset', 'lesson', 'created_date']
+
+    def validate_size(self, value):
+        if value > settings.LESSON_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError('Файл слишком большой.')
+        return value
+
+    def validate_filename(self, value):
+        return os.path.basename(value)
+
+    def create(self, validated_data):
+        validated_data['owner_id'] = self.context['request'].user.pk
+        return super().create(validated_data)
+
+
+class LessonUploadFinishSerializer(serializers.ModelSerializer):
+    video = LessonVideoField(read_only=True)
+
+    class Meta:
+        model = Lesson
+        fields = ['id', 'course', 'title', 'goal', 'video_time', 'status', 'video']
+        read_only_fields = ['video']
+        extra_kwargs = {'video_time': {'required': False}}
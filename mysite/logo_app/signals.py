@@ -0,0 +1,243 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import search, stats, rollup, access
+from .images import image_variants
+from .landing import invalidate_landing
+from .storage import connect_refcount_signals
+from .models import (Course, Category, CourseStats, Lesson, CourseReview, Favorite, PurchasedCourse,
+                     UserProfile, AboutUsImage, Highlight, WhyCourseHighlight, Home, WhyCourse, AboutUs,
+                     TitleForCourse, TitleForReview, TitleCourse, EmailTitle)
+
+
+# --- Поисковый индекс курсов ---
+
+@receiver(post_save, sender=Course)
+def course_saved_reindex(sender, instance, **kwargs):
+    search.index_courses(Course.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted_reindex(sender, instance, **kwargs):
+    search.remove_course(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def category_saved_reindex(sender, instance, created, **kwargs):
+    if not created:
+        search.index_courses(Course.objects.filter(category=instance))
+
+
+# --- Денормализованная статистика курса (CourseStats) ---
+
+@receiver(post_save, sender=Course)
+def course_created_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+@receiver(pre_save, sender=Lesson)
+def lesson_remember_old(sender, instance, raw=False, **kwargs):
+    instance._stats_old = None
+    if instance.pk and not raw:
+        instance._stats_old = Lesson.objects.filter(pk=instance.pk).values_list('course_id', 'video_time').first()
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_saved_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # loaddata: счётчики загружаются вместе с CourseStats (или rebuild_course_stats)
+    old = getattr(instance, '_stats_old', None)
+    if old and old[0] == instance.course_id:
+        stats.bump(instance.course_id, total_duration=instance.video_time - old[1])
+        return
+    if old:
+        stats.bump(old[0], lessons_count=-1, total_duration=-old[1])
+    stats.bump(instance.course_id, lessons_count=1, total_duration=instance.video_time)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted_stats(sender, instance, **kwargs):
+    stats.bump(instance.course_id, lessons_count=-1, total_duration=-instance.video_time)
+
+
+@receiver(pre_save, sender=CourseReview)
+def review_remember_old(sender, instance, raw=False, **kwargs):
+    instance._stats_old = None
+    if instance.pk and not raw:
+        instance._stats_old = CourseReview.objects.filter(pk=instance.pk).values_list('course_id', 'rating').first()
+
+
+@receiver(post_save, sender=CourseReview)
+def review_saved_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_stats_old', None)
+    if old == (instance.course_id, instance.rating):
+        return
+    if old:
+        stats.bump(old[0], **stats.rating_deltas(old[1], -1))
+    stats.bump(instance.course_id, **stats.rating_deltas(instance.rating, 1))
+
+
+@receiver(post_delete, sender=CourseReview)
+def review_deleted_stats(sender, instance, **kwargs):
+    stats.bump(instance.course_id, **stats.rating_deltas(instance.rating, -1))
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_saved_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.course_id, favorites_count=1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted_stats(sender, instance, **kwargs):
+    stats.bump(instance.course_id, favorites_count=-1)
+
+
+@receiver(post_save, sender=PurchasedCourse)
+def purchase_saved_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.course_id, purchases_count=1)
+
+
+@receiver(post_delete, sender=PurchasedCourse)
+def purchase_deleted_stats(sender, instance, **kwargs):
+    stats.bump(instance.course_id, purchases_count=-1)
+
+
+# --- Сводка владелец–студент (OwnerStudentRollup) ---
+
+@receiver(post_save, sender=PurchasedCourse)
+def purchase_saved_rollup(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollup.apply_purchase(rollup.course_state(instance.course), instance.user_id, 1)
+
+
+@receiver(post_delete, sender=PurchasedCourse)
+def purchase_deleted_rollup(sender, instance, **kwargs):
+    if instance.course_id in rollup.deleting_courses():
+        return  # вклад курса уже снят в course_deleting_rollup
+    try:
+        course = instance.course
+    except Course.DoesNotExist:
+        return
+    rollup.apply_purchase(rollup.course_state(course), instance.user_id, -1)
+
+
+def _stored_course_state(pk):
+    return Course.objects.filter(pk=pk).values_list('owner_id', 'status_course', 'category_id').first()
+
+
+@receiver(pre_save, sender=Course)
+def course_remember_state(sender, instance, raw=False, **kwargs):
+    instance._course_old = None
+    if instance.pk and not raw:
+        instance._course_old = _stored_course_state(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def course_saved_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # loaddata: сводка загружается вместе с OwnerStudentRollup (или rebuild_owner_rollups)
+    old = getattr(instance, '_course_old', None)
+    new = rollup.course_state(instance)
+    if old and old != new:
+        rollup.move_course(instance.pk, old, new)
+
+
+@receiver(pre_delete, sender=Course)
+def course_deleting_rollup(sender, instance, **kwargs):
+    # Состояние из базы: экземпляр в памяти мог быть изменён без сохранения
+    state = _stored_course_state(instance.pk)
+    if state:
+        rollup.remove_course(instance.pk, state)
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted_rollup(sender, instance, **kwargs):
+    rollup.course_deleted(instance.pk)
+
+
+# --- Кэш проверок доступа (logo_app.access) ---
+
+def forget_access(keys):
+    transaction.on_commit(lambda: access.forget(keys))
+
+
+@receiver(post_save, sender=PurchasedCourse)
+def purchase_saved_access(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        forget_access([access.bought_from_key(instance.user_id, instance.course.owner_id)])
+
+
+@receiver(post_delete, sender=PurchasedCourse)
+def purchase_deleted_access(sender, instance, **kwargs):
+    if instance.course_id in rollup.deleting_courses():
+        return  # ключи всех студентов курса сброшены в course_deleting_access
+    owner_id = Course.objects.filter(pk=instance.course_id).values_list('owner_id', flat=True).first()
+    if owner_id:
+        forget_access([access.bought_from_key(instance.user_id, owner_id)])
+
+
+@receiver(post_save, sender=Course)
+def course_saved_access(sender, instance, created, raw=False, **kwargs):
+    old = getattr(instance, '_course_old', None)
+    if not raw and old and old[0] != instance.owner_id:
+        forget_access(access.course_keys(instance.pk, {old[0], instance.owner_id}))
+
+
+@receiver(pre_delete, sender=Course)
+def course_deleting_access(sender, instance, **kwargs):
+    forget_access(access.course_keys(instance.pk, {instance.owner_id}))
+
+
+# --- Уменьшенные копии картинок при загрузке ---
+
+IMAGE_FIELDS = {
+    Course: ('image', 'time_image', 'lesson_image', 'progress_image'),
+    UserProfile: ('avatar',),
+    AboutUsImage: ('image',),
+    Highlight: ('icon',),
+    WhyCourseHighlight: ('highlight_icon',),
+}
+
+
+def generate_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    fields = [name for name in IMAGE_FIELDS[sender] if update_fields is None or name in update_fields]
+
+    def generate():
+        for name in fields:
+            image_variants(getattr(instance, name))
+
+    if fields:
+        transaction.on_commit(generate)
+
+
+for image_model in IMAGE_FIELDS:
+    post_save.connect(generate_image_variants, sender=image_model, dispatch_uid=f'image_variants_{image_model.__name__}')
+
+
+# --- Снимок главной страницы ---
+
+LANDING_MODELS = (Home, Highlight, WhyCourse, WhyCourseHighlight, AboutUs, AboutUsImage,
+                  TitleForCourse, TitleForReview, TitleCourse, EmailTitle)
+
+
+def landing_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_landing)
+
+
+for landing_model in LANDING_MODELS:
+    uid = f'landing_{landing_model.__name__}'
+    post_save.connect(landing_changed, sender=landing_model, dispatch_uid=uid)
+    post_delete.connect(landing_changed, sender=landing_model, dispatch_uid=uid)
+
+
+# --- Счётчики ссылок на файлы в CAS-хранилище ---
+
+connect_refcount_signals()
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.apps import apps as global_apps
+from django.db.models import Count, F, Sum
+
+from .models import CourseStats
+
+STAT_FIELDS = (
+    'lessons_count', 'total_duration', 'rating_count', 'rating_sum',
+    'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+    'favorites_count', 'purchases_count',
+)
+
+
+def empty_stats():
+    values = dict.fromkeys(STAT_FIELDS, 0)
+    values['total_duration'] = timedelta()
+    return values
+
+
+def bump(course_id, **deltas):
+    """Атомарно прибавляет дельты к счётчикам курса (UPDATE ... SET x = x + n)."""
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if updates:
+        # Нет строки (курс удаляется каскадом) — пропускаем, дрейф чинит rebuild_course_stats
+        CourseStats.objects.filter(course_id=course_id).update(**updates)
+
+
+def rating_deltas(rating, sign):
+    if not rating:
+        return {}
+    return {'rating_count': sign, 'rating_sum': sign * rating, f'rating_{rating}': sign}
+
+
+def compute_course_stats(course_ids=None, apps=global_apps):
+    """Считает агрегаты с нуля: по одному GROUP BY на каждую таблицу-источник."""
+    Course = apps.get_model('logo_app', 'Course')
+    Lesson = apps.get_model('logo_app', 'Lesson')
+    CourseReview = apps.get_model('logo_app', 'CourseReview')
+    Favorite = apps.get_model('logo_app', 'Favorite')
+    PurchasedCourse = apps.get_model('logo_app', 'PurchasedCourse')
+
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    result = {pk: empty_stats() for pk in courses.values_list('pk', flat=True)}
+
+    def grouped(queryset, *fields, **aggregates):
+        if course_ids is not None:
+            queryset = queryset.filter(course_id__in=list(result))
+        return queryset.order_by().values('course_id', *fields).annotate(**aggregates)
+
+    for row in grouped(Lesson.objects.all(), count=Count('id'), duration=Sum('video_time')):
+        if row['course_id'] in result:
+            result[row['course_id']]['lessons_count'] = row['count']
+            result[row['course_id']]['total_duration'] = row['duration'] or timedelta()
+    for row in grouped(CourseReview.objects.filter(rating__isnull=False), 'rating', count=Count('id')):
+        if row['course_id'] in result and row['rating']:
+            stats = result[row['course_id']]
+            stats['rating_count'] += row['count']
+            stats['rating_sum'] += row['rating'] * row['count']
+            stats[f"rating_{row['rating']}"] += row['count']
+    for model, field in ((Favorite, 'favorites_count'), (PurchasedCourse, 'purchases_count')):
+        for row in grouped(model.objects.all(), count=Count('id')):
+            if row['course_id'] in result:
+                result[row['course_id']][field] = row['count']
+    return result
+
+
+def find_drift(course_ids=None, apps=global_apps):
+    """Возвращает {course_id: {поле: (сохранено, должно быть)}} для расходящихся курсов."""
+    Stats = apps.get_model('logo_app', 'CourseStats')
+    expected = compute_course_stats(course_ids, apps)
+    stored = {row['course_id']: row for row in
+              Stats.objects.filter(course_id__in=list(expected)).values('course_id', *STAT_FIELDS)}
+    drift = {}
+    for course_id, values in expected.items():
+        current = stored.get(course_id)
+        diff = {field: (current[field] if current else None, value)
+                for field, value in values.items() if not current or current[field] != value}
+        if diff:
+            drift[course_id] = diff
+    return drift
+
+
+def rebuild_course_stats(course_ids=None, apps=global_apps):
+    Stats = apps.get_model('logo_app', 'CourseStats')
+    expected = compute_course_stats(course_ids, apps)
+    Stats.objects.bulk_create(
+        [Stats(course_id=course_id, **values) for course_id, values in expected.items()],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['course'],
+        update_fields=list(STAT_FIELDS),
+    )
+    return len(expected)
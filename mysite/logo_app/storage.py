@@ -0,0 +1,132 @@
+import hashlib
+import os
+import uuid
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, FileField
+from django.db.models.signals import pre_save, post_save, post_delete
+
+# Хранилище с адресацией по содержимому: файл лежит в cas/ab/cd/<sha256><расширение>,
+# одинаковые загрузки делят один файл. Сколько строк ссылается на файл, учитывает
+# MediaBlob.refcount; удаляет осиротевшие файлы команда cas_media.
+# Видео уроков — в отдельном хранилище вне MEDIA_ROOT (префикс protected/):
+# nginx их напрямую не отдаёт, только через X-Accel-Redirect после проверки доступа.
+
+CAS_PREFIX = 'cas'
+PROTECTED_CAS_PREFIX = 'protected'
+CAS_PREFIXES = (CAS_PREFIX, PROTECTED_CAS_PREFIX)
+
+
+def blob_name_for(digest, original_name, prefix=CAS_PREFIX):
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def digest_from_name(name):
+    # Для файлов из CAS хэш уже есть в имени
+    if not name or name.split('/', 1)[0] not in CAS_PREFIXES:
+        return None
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def __init__(self, prefix=CAS_PREFIX, **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым — переименование при совпадении не нужно
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        blob_name = blob_name_for(digest.hexdigest(), name, self.prefix)
+
+        MediaBlob = apps.get_model('logo_app', 'MediaBlob')
+        with transaction.atomic():
+            # Сначала ссылка под блокировкой строки, потом файл. Сборщик удаляет файл под той же
+            # блокировкой и только при refcount 0: либо он увидит нашу ссылку и не тронет файл,
+            # либо успеет удалить — тогда строки уже нет, мы создадим её и запишем файл заново
+            blob, _ = MediaBlob.objects.select_for_update().get_or_create(
+                name=blob_name, defaults={'size': content.size})
+            MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+            if not self.exists(blob_name):
+                # Пишем под временным именем и атомарно переименовываем:
+                # параллельная загрузка того же файла просто перезапишет идентичные байты
+                temp_name = super()._save(f'{blob_name}.{uuid.uuid4().hex}.tmp', content)
+                os.replace(self.path(temp_name), self.path(blob_name))
+            elif hasattr(content, 'temporary_file_path'):
+                os.remove(content.temporary_file_path())
+        return blob_name
+
+    def delete(self, name):
+        # Файл из CAS может быть общим: FieldFile.delete() только снимает ссылку,
+        # сам файл удалит сборщик cas_media, когда ссылок не останется
+        if digest_from_name(name):
+            self.release(name)
+        else:
+            super().delete(name)
+
+    def purge(self, name):
+        """Физически удаляет файл — только для сборщика, под блокировкой строки MediaBlob."""
+        super().delete(name)
+
+    def release(self, name):
+        """Строка перестала ссылаться на файл — уменьшаем счётчик (файл удалит сборщик)."""
+        if digest_from_name(name):
+            MediaBlob = apps.get_model('logo_app', 'MediaBlob')
+            MediaBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+
+
+def protected_storage():
+    # Вызываемый storage: путь берётся из настроек при загрузке моделей, а не пишется в миграцию
+    return ContentAddressedStorage(prefix=PROTECTED_CAS_PREFIX, location=settings.PROTECTED_MEDIA_ROOT)
+
+
+@lru_cache(maxsize=None)
+def cas_fields(model):
+    return tuple(field for field in model._meta.fields
+                 if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage))
+
+
+def cas_file_fields():
+    """(модель, поле) для всех FileField/ImageField, хранящихся в CAS."""
+    for model in apps.get_models():
+        for field in cas_fields(model):
+            yield model, field
+
+
+def remember_files(sender, instance, raw=False, update_fields=None, **kwargs):
+    fields = [field for field in cas_fields(sender) if update_fields is None or field.name in update_fields]
+    instance._cas_old_files = []
+    if instance.pk and fields and not raw:
+        old = sender._default_manager.filter(pk=instance.pk).values(*(field.attname for field in fields)).first()
+        instance._cas_old_files = [(field, (old or {}).get(field.attname)) for field in fields]
+
+
+def release_replaced(sender, instance, **kwargs):
+    for field, old_name in getattr(instance, '_cas_old_files', []):
+        if old_name and old_name != getattr(instance, field.attname).name:
+            field.storage.release(old_name)
+
+
+def release_deleted(sender, instance, **kwargs):
+    for field in cas_fields(sender):
+        field.storage.release(getattr(instance, field.attname).name)
+
+
+def connect_refcount_signals():
+    for model in {model for model, _ in cas_file_fields()}:
+        uid = f'cas_{model._meta.label_lower}'
+        pre_save.connect(remember_files, sender=model, dispatch_uid=uid)
+        post_save.connect(release_replaced, sender=model, dispatch_uid=uid)
+        post_delete.connect(release_deleted, sender=model, dispatch_uid=uid)
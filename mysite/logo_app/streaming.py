@@ -0,0 +1,106 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+# Отдача файлов уроков с поддержкой Range/If-Range.
+# Если задан LESSON_VIDEO_ACCEL_PREFIX, Django только проверяет доступ и
+# возвращает X-Accel-Redirect — байты (и Range) отдаёт nginx.
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _etag(stat):
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def _parse_range(header, size):
+    """
+    (start, end) включительно; None — заголовок не подходит, отдаём файл целиком;
+    ValueError — диапазон вне файла (416).
+    Несколько диапазонов не поддерживаем — RFC 9110 разрешает ответить 200.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _if_range_matches(header, etag, mtime):
+    if header.startswith('"') or header.startswith('W/'):
+        return header == etag
+    date = parse_http_date_safe(header)
+    return date is not None and date == int(mtime)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def accel_redirect_response(field_file, prefix):
+    response = HttpResponse()
+    response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name)
+    response['Content-Type'] = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    return response
+
+
+def ranged_file_response(request, path):
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = _etag(stat)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or _if_range_matches(if_range, etag, stat.st_mtime)):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        # Целиком — через wsgi.file_wrapper (sendfile у gunicorn)
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end - start + 1),
+                                         status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+def serve_protected_file(request, field_file):
+    prefix = getattr(settings, 'LESSON_VIDEO_ACCEL_PREFIX', '')
+    if prefix:
+        return accel_redirect_response(field_file, prefix)
+    return ranged_file_response(request, field_file.path)
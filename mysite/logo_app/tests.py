@@ -1,3 +1,1321 @@
-# from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import admin as django_admin
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core import mail, serializers
+from django.core.mail import get_connection
+from django.core.mail.backends import locmem
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers as drf_serializers
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.exceptions import TokenError
+
+from . import access, rollup, tokens
+from .admin import CategoryAdmin
+from .authentication import tokens_for_user
+from .counters import WriteBehindCounter
+from .filters import parse_course_filters
+from .images import VARIANTS_CACHE_TIMEOUT, _widths_for, derivative_storage, image_variants
+from .mailqueue import MAIL_QUEUE_LEASE, claim_batch, drain, enqueue_mail, retry_delay, send_batch
+from .media_probe import probe_duration, probe_path_seconds
+from .models import (Category, Course, CourseReview, CourseStats, Favorite, Lesson, LessonUpload, MediaBlob,
+                     NewsletterCampaign, OutboundEmail, OwnerStudentRollup, PurchasedCourse, RegisterEmail,
+                     TitleForCourse, UserProfile)
+from .newsletter import CampaignUnavailable, run_campaign
+from .public_api import MANIFEST_NAME, PUBLIC_API_EXPORTS, export_public_api, render_export
+from .rollup import find_rollup_drift, rebuild_rollups
+from .search import SEARCH_LIMIT, search_course_ids, stem
+from .reports import owner_students_report
+from .serializers import CategorySerializer, CourseListSerializer, OwnerWithStudentsFullSerializer
+from .tokens import CachedBlacklistRefreshToken
+from .uploads import UploadOffsetMismatch, expire_uploads, locked_part, part_path, write_chunk
+from .userimport import import_users
+from .views import UserProfileListAPIView
+
+
+def make_user(username, role='Студент', **extra):
+    # Пароль не нужен (токены выдаём напрямую), PBKDF2 только замедлил бы тесты
+    return UserProfile.objects.create(username=username, email=f'{username}@example.com',
+                                      password='!', role=role, **extra)
+
+
+def make_course(owner, title='Курс', status_course='Бесплатно', category=None, **extra):
+    category = category or Category.objects.create(category_name='Категория')
+    fields = dict(brief_description='-', description='-', image='course.jpg', time_image='t.jpg',
+                  lesson_image='l.jpg', progress_image='p.jpg', progress='0')
+    fields.update(extra)
+    return Course.objects.create(owner=owner, title=title, category=category, status_course=status_course, **fields)
+
+
+def make_lesson(course, title='Урок', status='Открытый', video_time=timedelta(minutes=5), **extra):
+    return Lesson.objects.create(course=course, title=title, video='lesson.mp4', goal='-',
+                                 video_time=video_time, status=status, **extra)
+
+
+class WriteBehindCounterTests(TestCase):
+
+    def setUp(self):
+        self.lesson = make_lesson(make_course(make_user('owner', role='Владелец')))
+        self.counter = WriteBehindCounter(Lesson, 'views', interval=3600, threshold=2)
+        # Фоновый поток в тестах не нужен — сброс вызываем сами
+        patcher = mock.patch.object(WriteBehindCounter, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_never_writes_on_request_path(self):
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.counter.hit(self.lesson.pk)
+        self.assertTrue(self.counter._wake.is_set())
+        self.assertEqual(self.counter.pending(self.lesson.pk), 5)
+
+    def test_flush_applies_increments(self):
+        self.counter.hit(self.lesson.pk, 3)
+        self.assertEqual(self.counter.flush(), 1)
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.views, 3)
+        self.assertEqual(self.counter.pending(self.lesson.pk), 0)
+
+    def test_failed_flush_returns_increments_to_buffer(self):
+        self.counter.hit(self.lesson.pk, 4)
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                self.counter.flush()
+        self.assertEqual(self.counter.pending(self.lesson.pk), 4)
+        self.counter.flush()
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.views, 4)
+
+
+class WriteBehindCounterWorkerTests(TestCase):
+
+    def test_dead_worker_is_restarted(self):
+        counter = WriteBehindCounter(Lesson, 'views', interval=3600, threshold=100)
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        counter._pid, counter._thread = os.getpid(), dead
+        with mock.patch.object(WriteBehindCounter, '_run'):
+            counter._ensure_worker()
+        self.assertIsNot(counter._thread, dead)
+
+    def test_worker_survives_flush_error(self):
+        counter = WriteBehindCounter(Lesson, 'views', interval=0, threshold=100)
+        calls = []
+
+        def flush():
+            calls.append(1)
+            if len(calls) == 1:
+                raise DatabaseError('down')
+            raise SystemExit  # второй круг — значит, поток пережил ошибку
+
+        with mock.patch.object(counter, 'flush', side_effect=flush), \
+                mock.patch('logo_app.counters.connection'), self.assertLogs('logo_app.counters', 'ERROR'):
+            with self.assertRaises(SystemExit):
+                counter._run()
+        self.assertEqual(len(calls), 2)
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT и хранилище видео уроков — во временных каталогах."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_patch = self.settings(MEDIA_ROOT=os.path.join(self.media_root, 'media'))
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.video_storage = Lesson._meta.get_field('video').storage
+        protected = os.path.join(self.media_root, 'protected')
+        for attribute in ('location', 'base_location'):
+            patcher = mock.patch.object(self.video_storage, attribute, protected)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class LessonVideoAccessTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.lesson = make_lesson(make_course(make_user('owner', role='Владелец')))
+        self.lesson.video.save('intro.mp4', ContentFile(b'0123456789'), save=True)
+        self.client = APIClient()
+
+    def test_video_stored_outside_media_root(self):
+        path = self.lesson.video.path
+        self.assertFalse(path.startswith(settings.MEDIA_ROOT))
+        self.assertTrue(self.lesson.video.name.startswith('protected/'))
+
+    def test_serializer_links_to_checked_endpoint(self):
+        response = self.client.get(f'/lesson/{self.lesson.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['video'].endswith(f'/lesson/{self.lesson.pk}/video'))
+        self.assertNotIn(settings.MEDIA_URL, response.data['video'])
+
+    def test_range_request(self):
+        response = self.client.get(f'/lesson/{self.lesson.pk}/video', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+    def test_closed_lesson_video_denied(self):
+        Lesson.objects.filter(pk=self.lesson.pk).update(status='Закрытый')
+        response = self.client.get(f'/lesson/{self.lesson.pk}/video')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_migration_moves_videos_out_of_media_root(self):
+        legacy = default_storage.save('lesson_video/old.mp4', ContentFile(b'old video'))
+        Lesson.objects.filter(pk=self.lesson.pk).update(video=legacy)
+        move_videos = import_module('logo_app.migrations.0013_move_lesson_videos').move_videos
+        move_videos(django_apps, None)
+
+        self.lesson.refresh_from_db()
+        self.assertTrue(self.lesson.video.name.startswith('protected/'))
+        with self.lesson.video.open('rb') as file:
+            self.assertEqual(file.read(), b'old video')
+        self.assertEqual(MediaBlob.objects.get(name=legacy).refcount, 0)
+
+    def test_accel_redirect(self):
+        with self.settings(LESSON_VIDEO_ACCEL_PREFIX='/protected_media/'):
+            response = self.client.get(f'/lesson/{self.lesson.pk}/video')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected_media/{self.lesson.video.name}')
+
+
+def auth_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(user).access_token}')
+    return client
+
+
+class LessonUploadTests(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        settings_patch = self.settings(LESSON_UPLOAD_TEMP_DIR=self.temp_dir)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.owner = make_user('owner', role='Владелец')
+        self.upload = LessonUpload.objects.create(owner=self.owner, filename='a.mp4', size=8)
+
+    def read_part(self):
+        with open(part_path(self.upload), 'rb') as part:
+            return part.read()
+
+    def test_chunks_append_by_offset(self):
+        write_chunk(self.upload, 0, io.BytesIO(b'abcd'))
+        write_chunk(self.upload, 4, io.BytesIO(b'efgh'))
+        self.upload.refresh_from_db()
+        self.assertTrue(self.upload.is_complete)
+        self.assertEqual(self.read_part(), b'abcdefgh')
+
+    def test_wrong_offset_is_rejected(self):
+        write_chunk(self.upload, 0, io.BytesIO(b'abcd'))
+        with self.assertRaises(UploadOffsetMismatch) as error:
+            write_chunk(self.upload, 2, io.BytesIO(b'zz'))
+        self.assertEqual(error.exception.args[0], 4)
+
+    def test_stale_offset_does_not_touch_file(self):
+        # Другой запрос уже записал кусок с тем же смещением
+        stale = LessonUpload.objects.get(pk=self.upload.pk)
+        write_chunk(self.upload, 0, io.BytesIO(b'abcd'))
+        with self.assertRaises(UploadOffsetMismatch):
+            write_chunk(stale, 0, io.BytesIO(b'ZZ'))
+        self.assertEqual(self.read_part(), b'abcd')
+
+    def test_concurrent_patch_gets_conflict(self):
+        with locked_part(self.upload):
+            with self.assertRaises(UploadOffsetMismatch):
+                write_chunk(LessonUpload.objects.get(pk=self.upload.pk), 0, io.BytesIO(b'ZZZZ'))
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.offset, 0)
+
+    def test_patch_conflict_returns_409(self):
+        client = auth_client(self.owner)
+        client.patch(f'/lesson/uploads/{self.upload.pk}', b'abcd',
+                     content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+        response = client.patch(f'/lesson/uploads/{self.upload.pk}', b'abcd',
+                                content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '4')
+
+    def test_expire_removes_idle_uploads_and_stray_parts(self):
+        write_chunk(self.upload, 0, io.BytesIO(b'ab'))
+        fresh = LessonUpload.objects.create(owner=self.owner, filename='b.mp4', size=8)
+        write_chunk(fresh, 0, io.BytesIO(b'ab'))
+        LessonUpload.objects.filter(pk=self.upload.pk).update(created_date=timezone.now() - timedelta(days=2))
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(part_path(self.upload), (old, old))
+        stray = os.path.join(self.temp_dir, 'ffffffff-ffff-ffff-ffff-ffffffffffff.part')
+        open(stray, 'wb').close()
+        os.utime(stray, (old, old))
+
+        self.assertEqual(expire_uploads(timedelta(hours=24)), (1, 1))
+        self.assertFalse(LessonUpload.objects.filter(pk=self.upload.pk).exists())
+        self.assertFalse(os.path.exists(stray))
+        self.assertTrue(os.path.exists(part_path(fresh)))
+
+
+class DerivativeWidthsTests(TestCase):
+
+    def test_widths(self):
+        with mock.patch('logo_app.images.DERIVATIVE_WIDTHS', (320, 640, 1280)):
+            self.assertEqual(_widths_for(2000), [320, 640, 1280])
+            self.assertEqual(_widths_for(1280), [320, 640, 1280])
+            self.assertEqual(_widths_for(700), [320, 640, 700])
+            self.assertEqual(_widths_for(640), [320, 640])
+            self.assertEqual(_widths_for(100), [100])
+
+
+def png_bytes(width, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, width // 2), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ImageVariantsCacheTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.course = make_course(make_user('owner', role='Владелец'))
+
+    def test_variants_cached_by_file_name_with_timeout(self):
+        self.course.image.save('cover.png', ContentFile(png_bytes(700, 'red')), save=False)
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            variants = image_variants(self.course.image)
+        self.assertEqual(sorted(variants['webp']), [320, 640, 700])
+        self.assertTrue(all(derivative_storage.exists(name) for name in variants['jpeg'].values()))
+        for call in cache_set.call_args_list:
+            self.assertEqual(call.args[2], VARIANTS_CACHE_TIMEOUT)
+        self.assertIn(self.course.image.name, cache_set.call_args_list[-1].args[0])
+
+        with mock.patch('logo_app.images.Image.open') as image_open:
+            self.assertEqual(image_variants(self.course.image), variants)
+        image_open.assert_not_called()
+
+    def test_new_upload_gets_its_own_variants(self):
+        self.course.image.save('cover.png', ContentFile(png_bytes(700, 'red')), save=False)
+        old = image_variants(self.course.image)
+        self.course.image.save('cover.png', ContentFile(png_bytes(400, 'blue')), save=False)
+        new = image_variants(self.course.image)
+        self.assertEqual(sorted(new['webp']), [320, 400])
+        self.assertNotEqual(old['webp'][320], new['webp'][320])
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.course = make_course(make_user('owner', role='Владелец'))
+
+    def lesson_with_video(self, content=b'same video'):
+        lesson = make_lesson(self.course)
+        lesson.video.save('v.mp4', ContentFile(content), save=True)
+        return lesson
+
+    def blob(self, name):
+        return MediaBlob.objects.get(name=name)
+
+    def collect(self):
+        call_command('cas_media', grace_minutes=0, stdout=io.StringIO())
+
+    def test_same_content_shares_one_blob(self):
+        first, second = self.lesson_with_video(), self.lesson_with_video()
+        self.assertEqual(first.video.name, second.video.name)
+        self.assertEqual(self.blob(first.video.name).refcount, 2)
+
+    def test_deleting_one_reference_keeps_shared_file(self):
+        first, second = self.lesson_with_video(), self.lesson_with_video()
+        path = second.video.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.blob(second.video.name).refcount, 1)
+
+    def test_field_file_delete_only_releases(self):
+        # Так откатывается неудачный finish_upload
+        first, second = self.lesson_with_video(), self.lesson_with_video()
+        first.video.delete(save=False)
+        self.assertTrue(os.path.exists(second.video.path))
+        self.assertEqual(self.blob(second.video.name).refcount, 1)
+
+    def test_collector_removes_unreferenced_file(self):
+        lesson = self.lesson_with_video()
+        name, path = lesson.video.name, lesson.video.path
+        lesson.delete()
+        self.collect()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_collector_keeps_reused_file(self):
+        lesson = self.lesson_with_video()
+        name, path = lesson.video.name, lesson.video.path
+        lesson.delete()
+        self.lesson_with_video()  # повторная загрузка того же содержимого
+        self.collect()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.blob(name).refcount, 1)
+
+    def test_upload_restores_file_removed_by_collector(self):
+        lesson = self.lesson_with_video()
+        path = lesson.video.path
+        os.remove(path)
+        self.lesson_with_video()
+        self.assertTrue(os.path.exists(path))
+
+
+class LandingSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_snapshot_is_cached_and_invalidated_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TitleForCourse.objects.create(title='Первый', description='-')
+        self.assertEqual(self.client.get('/landing/').data['title_for_course'][0]['title'], 'Первый')
+        with self.assertNumQueries(0):
+            self.client.get('/landing/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TitleForCourse.objects.update(title='Второй')
+            TitleForCourse.objects.first().save()
+        self.assertEqual(self.client.get('/landing/').data['title_for_course'][0]['title'], 'Второй')
+
+
+class PrefetchPlanMixinTests(TestCase):
+
+    def test_plan_applied_when_get_queryset_is_overridden(self):
+        student = make_user('student')
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=student)
+        view = UserProfileListAPIView()
+        view.setup(request)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        queryset = view.filter_queryset(view.get_queryset())
+        lookups = {lookup.prefetch_through for lookup in queryset._prefetch_related_lookups}
+        self.assertEqual(lookups, {'favorites', 'purchased_courses'})
+        self.assertEqual([user.pk for user in queryset], [student.pk])
+
+
+class RollupMoveCourseTests(TestCase):
+
+    def setUp(self):
+        self.owner = make_user('owner', role='Владелец')
+        self.other_owner = make_user('other', role='Владелец')
+        self.category = Category.objects.create(category_name='Дизайн')
+
+    def _buy(self, course, count, prefix):
+        students = [make_user(f'{prefix}{i}') for i in range(count)]
+        PurchasedCourse.objects.bulk_create([PurchasedCourse(user=student, course=course) for student in students])
+        return students
+
+    def _move(self, course):
+        course.owner = self.other_owner
+        course.status_course = 'Платно'
+        course.category = self.category
+        with CaptureQueriesContext(connection) as queries:
+            course.save()
+        return len(queries)
+
+    def test_move_course_matches_rebuild(self):
+        course = make_course(self.owner)
+        other = make_course(self.owner, category=self.category)
+        students = [make_user(f's{i}') for i in range(3)]
+        for student in students:
+            PurchasedCourse.objects.create(user=student, course=course)
+        PurchasedCourse.objects.create(user=students[0], course=other)
+
+        self._move(course)
+
+        self.assertEqual(find_rollup_drift(), {})
+        row = OwnerStudentRollup.objects.get(owner=self.other_owner, student=students[0])
+        self.assertEqual((row.paid_count, row.free_count), (1, 0))
+        self.assertEqual(row.categories, {str(self.category.pk): 1})
+        self.assertEqual(list(OwnerStudentRollup.objects.filter(owner=self.owner)
+                              .values_list('student_id', flat=True)), [students[0].pk])
+
+    def test_query_count_does_not_depend_on_purchasers(self):
+        small, large = make_course(self.owner), make_course(self.owner, title='Большой')
+        # bulk_create не шлёт сигналы — сводку собираем с нуля
+        self._buy(small, 2, 'a')
+        self._buy(large, 20, 'b')
+        rebuild_rollups()
+        self.assertEqual(self._move(small), self._move(large))
+        self.assertEqual(find_rollup_drift(), {})
+
+
+    def test_course_delete_removes_contribution(self):
+        course = make_course(self.owner, status_course='Платно', category=self.category)
+        other = make_course(self.owner)
+        students = self._buy(course, 3, 's')
+        PurchasedCourse.objects.create(user=students[0], course=other)
+        rebuild_rollups()
+
+        with mock.patch('logo_app.rollup.apply_purchase') as apply_purchase:
+            course.delete()
+        apply_purchase.assert_not_called()
+        self.assertEqual(find_rollup_drift(), {})
+        self.assertEqual(list(OwnerStudentRollup.objects.values_list('student_id', flat=True)), [students[0].pk])
+        self.assertEqual(rollup.deleting_courses(), set())
+
+        # Дальнейшие удаления покупок снова обновляют сводку по одной
+        PurchasedCourse.objects.get(user=students[0], course=other).delete()
+        self.assertFalse(OwnerStudentRollup.objects.exists())
+
+    def test_course_delete_query_count_does_not_depend_on_purchasers(self):
+        small, large = make_course(self.owner), make_course(self.owner, title='Большой')
+        self._buy(small, 2, 'a')
+        self._buy(large, 20, 'b')
+        rebuild_rollups()
+
+        def rollup_queries(course):
+            with CaptureQueriesContext(connection) as queries:
+                course.delete()
+            return [query['sql'] for query in queries if OwnerStudentRollup._meta.db_table in query['sql']]
+
+        small_queries = rollup_queries(small)
+        self.assertTrue(small_queries)
+        self.assertEqual(len(rollup_queries(large)), len(small_queries))
+        self.assertEqual(find_rollup_drift(), {})
+
+    def test_bulk_and_owner_cascade_delete(self):
+        first, second = make_course(self.owner), make_course(self.owner, status_course='Платно')
+        kept = make_course(self.other_owner)
+        students = self._buy(first, 2, 'a')
+        for student in students:
+            PurchasedCourse.objects.create(user=student, course=second)
+            PurchasedCourse.objects.create(user=student, course=kept)
+        rebuild_rollups()
+
+        Course.objects.filter(pk=first.pk).delete()
+        self.assertEqual(find_rollup_drift(), {})
+        self.owner.delete()
+        self.assertEqual(find_rollup_drift(), {})
+        self.assertEqual(set(OwnerStudentRollup.objects.values_list('owner_id', flat=True)), {self.other_owner.pk})
+
+    def test_raw_course_save_is_ignored(self):
+        course = make_course(self.owner)
+        self._buy(course, 2, 's')
+        rebuild_rollups()
+        course.owner = self.other_owner
+        with mock.patch('logo_app.rollup.move_course') as move_course:
+            for obj in serializers.deserialize('json', serializers.serialize('json', [course])):
+                obj.save()
+        move_course.assert_not_called()
+
+
+class RosterExportTests(TestCase):
+
+    def test_csv_cells_are_not_formulas(self):
+        owner = make_user('owner', role='Владелец')
+        course = make_course(owner, title='=HYPERLINK("http://evil")')
+        student = make_user('+student')
+        PurchasedCourse.objects.create(user=student, course=course)
+
+        response = auth_client(owner).get(reverse('owner-students-export'))
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode('utf-8-sig')
+        header, row = list(csv.reader(io.StringIO(body)))
+        values = dict(zip(header, row))
+        self.assertEqual(values['course_title'], '\'=HYPERLINK("http://evil")')
+        self.assertEqual(values['username'], "'+student")
+        self.assertEqual(values['status_course'], 'Бесплатно')
+
+
+class AccessChecksTests(TestCase):
+
+    def test_purchase_is_visible_on_the_next_request(self):
+        owner = make_user('owner', role='Владелец')
+        student = make_user('student')
+        client = auth_client(owner)
+        url = reverse('user_detail', args=[student.pk])
+        self.assertEqual(client.get(url).status_code, 403)
+
+        PurchasedCourse.objects.create(user=student, course=make_course(owner))
+        self.assertEqual(client.get(url).status_code, 200)
+
+    def test_closed_lesson_denied_even_to_course_owner(self):
+        owner = make_user('owner', role='Владелец')
+        lesson = make_lesson(make_course(owner), status='Закрытый')
+        response = auth_client(owner).get(reverse('lesson-detail', args=[lesson.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class SharedAccessCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for patcher in (mock.patch('logo_app.access.cache_is_shared', return_value=True),
+                        # картинки курса в тесте не существуют — копии после коммита не строим
+                        mock.patch('logo_app.signals.image_variants')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.owner = make_user('owner', role='Владелец')
+        self.student = make_user('student')
+        self.course = make_course(self.owner)
+
+    def bought(self, owner=None):
+        # Новый HttpRequest — как следующий запрос, без кэша предыдущего
+        request = APIRequestFactory().get('/')
+        return access.has_bought_from(request, self.student.pk, (owner or self.owner).pk)
+
+    def test_one_exists_query_then_shared_cache(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(self.bought())
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 1', queries[0]['sql'])
+        self.assertIs(cache.get(access.bought_from_key(self.student.pk, self.owner.pk)), False)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.bought())
+
+    def test_request_cache_only_without_shared_cache(self):
+        request = APIRequestFactory().get('/')
+        with mock.patch('logo_app.access.cache_is_shared', return_value=False):
+            with self.assertNumQueries(1):
+                access.has_bought_from(request, self.student.pk, self.owner.pk)
+                access.has_bought_from(request, self.student.pk, self.owner.pk)
+            with self.assertNumQueries(1):
+                self.bought()
+        self.assertIsNone(cache.get(access.bought_from_key(self.student.pk, self.owner.pk)))
+
+    def test_purchase_invalidates_after_commit(self):
+        self.assertFalse(self.bought())
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase = PurchasedCourse.objects.create(user=self.student, course=self.course)
+            self.assertFalse(self.bought())
+        self.assertTrue(self.bought())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase.delete()
+        self.assertFalse(self.bought())
+
+    def test_owner_change_and_course_delete_invalidate(self):
+        other = make_user('other', role='Владелец')
+        PurchasedCourse.objects.create(user=self.student, course=self.course)
+        self.assertTrue(self.bought())
+        self.assertFalse(self.bought(other))
+
+        self.course.owner = other
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+        self.assertFalse(self.bought())
+        self.assertTrue(self.bought(other))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertFalse(self.bought(other))
+
+    def test_profile_endpoint_sees_purchase(self):
+        client = auth_client(self.owner)
+        url = reverse('user_detail', args=[self.student.pk])
+        self.assertEqual(client.get(url).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchasedCourse.objects.create(user=self.student, course=self.course)
+        self.assertEqual(client.get(url).status_code, 200)
+
+
+@override_settings(TOKEN_BLACKLIST_FILTER=True)
+class RevokedTokenFilterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # Каждый тест — «новый процесс» без фильтра
+        for name, value in (('_filter', None), ('_filter_seen', 0)):
+            patcher = mock.patch.object(tokens, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = make_user('student')
+
+    def _revoke(self):
+        refresh = tokens_for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh.blacklist()
+        return str(refresh)
+
+    def test_revocation_added_incrementally(self):
+        tokens.revoked_filter()
+        with mock.patch.object(tokens, 'build_filter', wraps=tokens.build_filter) as build:
+            revoked = self._revoke()
+            with self.assertRaises(TokenError):
+                CachedBlacklistRefreshToken(revoked)
+            valid = str(tokens_for_user(self.user))
+            with self.assertNumQueries(0):
+                CachedBlacklistRefreshToken(valid)
+        build.assert_not_called()
+
+    def test_gap_in_log_rebuilds_from_db(self):
+        tokens.revoked_filter()
+        revoked = self._revoke()
+        cache.delete(tokens.log_entry_key(1))
+        with mock.patch.object(tokens, 'build_filter', wraps=tokens.build_filter) as build:
+            with self.assertRaises(TokenError):
+                CachedBlacklistRefreshToken(revoked)
+        build.assert_called_once()
+
+
+class NewsletterClaimTests(TestCase):
+
+    def setUp(self):
+        RegisterEmail.objects.bulk_create([RegisterEmail(email=f'user{i}@example.com') for i in range(3)])
+        self.campaign = NewsletterCampaign.objects.create(subject='Новости', body='Текст')
+
+    def test_finished_campaign_needs_force(self):
+        self.assertEqual(run_campaign(self.campaign, threads=1)[0], 3)
+        self.campaign.refresh_from_db()
+        self.assertIsNotNone(self.campaign.finished_date)
+        self.assertIsNone(self.campaign.claimed_until)
+
+        with self.assertRaises(CampaignUnavailable):
+            run_campaign(self.campaign, threads=1)
+        with self.assertRaisesMessage(CommandError, '--force'):
+            call_command('send_newsletter', campaign=self.campaign.pk, stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+
+        self.assertEqual(run_campaign(self.campaign, threads=1, force=True)[0], 3)
+        self.assertEqual(len(mail.outbox), 6)
+
+    def test_running_campaign_is_not_sent_twice(self):
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            claim_token='other', claimed_until=timezone.now() + timedelta(minutes=5))
+        with self.assertRaises(CampaignUnavailable):
+            run_campaign(self.campaign, threads=1)
+        self.assertEqual(mail.outbox, [])
+
+    def test_abandoned_claim_expires(self):
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            claim_token='crashed', claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(run_campaign(self.campaign, threads=1)[0], 3)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTests(TestCase):
+
+    def test_per_row_errors(self):
+        make_user('taken')
+        report = import_users([
+            {'username': 123, 'email': 'a@example.com', 'password': 'secret'},
+            {'username': 'numeric', 'email': 'n@example.com', 'password': 12345},
+            {'username': 'fine', 'email': 'fine@example.com', 'password': 'secret'},
+            {'username': 'taken', 'email': 'other@example.com', 'password': 'secret'},
+            {'username': 'copy', 'email': 'FINE@example.com', 'password': 'secret'},
+        ], workers=1).as_dict()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual({error['row']: set(error['errors']) for error in report['errors']},
+                         {1: {'username'}, 2: {'password'}, 4: {'username'}, 5: {'email'}})
+        self.assertTrue(UserProfile.objects.get(username='fine').check_password('secret'))
+
+    def test_race_on_insert_blames_the_taken_field(self):
+        make_user('taken')
+        rows = [{'username': 'taken', 'email': 'new@example.com', 'password': 'secret'},
+                {'username': 'fresh', 'email': 'fresh@example.com', 'password': 'secret'}]
+        # Первая проверка «не видит» занятый username — как будто его заняли сразу после неё
+        with mock.patch('logo_app.userimport._taken', side_effect=[(set(), set()), ({'taken'}, set())]):
+            report = import_users(rows, workers=1).as_dict()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'], [{'row': 1, 'errors': {
+            'username': 'Пользователь с таким username уже существует'}}])
+
+    def test_api_queues_job_for_worker(self):
+        staff = make_user('admin', is_staff=True)
+        client = auth_client(staff)
+        upload = ContentFile(b'username,email,password\nalice,alice@example.com,secret\n', name='users.csv')
+        with tempfile.TemporaryDirectory() as directory, self.settings(USER_IMPORT_TEMP_DIR=directory):
+            response = client.post(reverse('user-import'), {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, 202)
+            self.assertFalse(UserProfile.objects.filter(username='alice').exists())
+
+            call_command('run_user_imports', workers=1, stdout=io.StringIO())
+            self.assertEqual(os.listdir(directory), [])
+        self.assertTrue(UserProfile.objects.filter(username='alice').exists())
+        job = client.get(response['Location']).data
+        self.assertEqual((job['status'], job['report']), ('done', {'created': 1, 'errors': []}))
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.course = make_course(make_user('owner', role='Владелец'))
+        self.lessons = [make_lesson(self.course, title=f'Урок {i}') for i in range(5)]
+        self.client = APIClient()
+
+    def _walk(self, response, between_pages=None):
+        ids = [lesson['id'] for lesson in response.data['results']]
+        while response.data['next']:
+            if between_pages:
+                between_pages()
+                between_pages = None
+            response = self.client.get(response.data['next'])
+            ids += [lesson['id'] for lesson in response.data['results']]
+        return ids
+
+    def test_pages_survive_inserts_and_deletes(self):
+        expected = [lesson.pk for lesson in self.lessons]
+        first = self.client.get(reverse('lesson-list'), {'limit': 2})
+        self.assertEqual(len(first.data['results']), 2)
+
+        def change():
+            # Удаляем уже показанный урок и добавляем новый — страницы не сдвигаются
+            self.lessons[0].delete()
+            expected.append(make_lesson(self.course, title='Новый').pk)
+
+        self.assertEqual(self._walk(first, change), expected)
+
+    def test_limit_is_capped(self):
+        with mock.patch('logo_app.pagination.KeysetCursorPagination.max_page_size', 3):
+            response = self.client.get(reverse('lesson-list'), {'limit': 1000})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_course_list_cursor_keeps_filters(self):
+        for i in range(3):
+            make_course(self.course.owner, title=f'Платный {i}', status_course='Платно')
+        response = self.client.get(reverse('course_list'), {'limit': 2, 'status_course': 'Платно'})
+        titles = []
+        while True:
+            titles += [course['title'] for course in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(titles, [f'Платный {i}' for i in range(3)])
+
+
+class CatalogSerializerTests(TestCase):
+
+    def setUp(self):
+        self.owner = make_user('owner', role='Владелец')
+        self.student = make_user('student')
+        self.empty = make_course(self.owner, title='Пустой')
+        self.course = make_course(self.owner, title='С уроками')
+        make_lesson(self.course)
+        make_lesson(self.course, title='Урок 2', video_time=timedelta(minutes=7, seconds=30))
+        Favorite.objects.create(user=self.student, course=self.course)
+
+    def _serialize(self, user):
+        request = Request(APIRequestFactory().get('/courses/'))
+        request.user = user
+        with self.assertNumQueries(1):
+            return {course['title']: course for course in CourseListSerializer(
+                Course.objects.for_catalog(user), many=True, context={'request': request}).data}
+
+    def test_one_query_and_output_format_for_anonymous(self):
+        courses = self._serialize(AnonymousUser())
+        self.assertEqual((courses['Пустой']['total_duration'], courses['Пустой']['lessons_count']),
+                         ('0:00:00', '0 уроков'))
+        self.assertEqual((courses['С уроками']['total_duration'], courses['С уроками']['lessons_count']),
+                         ('0:12:30', '2 уроков'))
+        self.assertFalse(any(course['is_favorite'] for course in courses.values()))
+
+    def test_favorite_flag_for_authenticated_user(self):
+        courses = self._serialize(self.student)
+        self.assertTrue(courses['С уроками']['is_favorite'])
+        self.assertFalse(courses['Пустой']['is_favorite'])
+
+    def test_catalog_query_count_does_not_grow(self):
+        client = auth_client(self.student)
+        with CaptureQueriesContext(connection) as small:
+            client.get(reverse('course_list'))
+        for i in range(5):
+            make_lesson(make_course(self.owner, title=f'Ещё {i}'))
+        with CaptureQueriesContext(connection) as large:
+            response = client.get(reverse('course_list'))
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertEqual(len(small), len(large))
+
+
+class CourseSearchTests(TestCase):
+
+    def setUp(self):
+        self.owner = make_user('owner', role='Владелец')
+
+    def test_stemmer_folds_word_forms(self):
+        self.assertEqual({stem(word) for word in ('курс', 'курсы', 'курсов', 'курсами')}, {'курс'})
+        self.assertEqual(stem('программирования'), stem('программирование'))
+
+    def test_word_forms_match(self):
+        course = make_course(self.owner, title='Курсы программирования')
+        response = APIClient().get(reverse('course_search'), {'q': 'курс программирование'})
+        self.assertEqual([found['id'] for found in response.data], [course.pk])
+
+    def test_title_ranks_above_description(self):
+        in_description = make_course(self.owner, title='Основы', description='Немного про дизайн')
+        in_title = make_course(self.owner, title='Дизайн интерфейсов')
+        self.assertEqual(search_course_ids('дизайн'), [in_title.pk, in_description.pk])
+
+    def test_reindexed_on_title_change_and_category_rename(self):
+        category = Category.objects.create(category_name='Музыка')
+        course = make_course(self.owner, title='Гитара', category=category)
+        course.title = 'Барабаны'
+        course.save()
+        self.assertEqual(search_course_ids('гитара'), [])
+        self.assertEqual(search_course_ids('барабаны'), [course.pk])
+
+        category.category_name = 'Ритмика'
+        category.save()
+        self.assertEqual(search_course_ids('музыка'), [])
+        self.assertEqual(search_course_ids('ритмика'), [course.pk])
+
+    def test_deleted_course_leaves_index(self):
+        course = make_course(self.owner, title='Шахматы')
+        course.delete()
+        self.assertEqual(search_course_ids('шахматы'), [])
+
+    def test_results_capped(self):
+        for i in range(SEARCH_LIMIT + 5):
+            make_course(self.owner, title=f'Алгебра {i}')
+        self.assertEqual(len(search_course_ids('алгебра')), SEARCH_LIMIT)
+
+
+class CatalogFiltersTests(TestCase):
+
+    def setUp(self):
+        owner = make_user('owner', role='Владелец')
+        self.design = Category.objects.create(category_name='Дизайн')
+        self.code = Category.objects.create(category_name='Код')
+        for title, category, status_course, price in (
+                ('Дизайн 1', self.design, 'Бесплатно', 0),
+                ('Дизайн 2', self.design, 'Бесплатно', 0),
+                ('Дизайн PRO', self.design, 'Платно', 500),
+                ('Python', self.code, 'Платно', 1000),
+                ('Go', self.code, 'Платно', 3000)):
+            make_course(owner, title=title, category=category, status_course=status_course, price=price)
+
+    def _get(self, **params):
+        response = APIClient().get(reverse('course_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return {course['title'] for course in response.data['results']}, response.data['facets']
+
+    def _category_counts(self, facets):
+        return {item['id']: item['count'] for item in facets['category']}
+
+    def test_facets_match_filtered_results(self):
+        titles, facets = self._get(status_course='Платно')
+        self.assertEqual(titles, {'Дизайн PRO', 'Python', 'Go'})
+        # Категории — с учётом статуса, статусы — без собственного фильтра
+        self.assertEqual(self._category_counts(facets), {self.design.pk: 1, self.code.pk: 2})
+        self.assertEqual(facets['status_course'], {'Бесплатно': 2, 'Платно': 3})
+
+        titles, facets = self._get(status_course='Платно', category=str(self.design.pk))
+        self.assertEqual(titles, {'Дизайн PRO'})
+        self.assertEqual(self._category_counts(facets)[self.design.pk], len(titles))
+        self.assertEqual(facets['status_course'], {'Бесплатно': 2, 'Платно': 1})
+
+    def test_price_range_narrows_results_and_facets(self):
+        titles, facets = self._get(price_min=500, price_max=1000)
+        self.assertEqual(titles, {'Дизайн PRO', 'Python'})
+        self.assertEqual(self._category_counts(facets), {self.design.pk: 1, self.code.pk: 1})
+        self.assertEqual(sum(facets['status_course'].values()), len(titles))
+
+    def test_invalid_filter(self):
+        response = APIClient().get(reverse('course_list'), {'status_course': 'Скидка'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters_parsed_once(self):
+        with mock.patch('logo_app.views.parse_course_filters', wraps=parse_course_filters) as parse:
+            self._get(category=f'{self.design.pk},{self.code.pk}')
+        parse.assert_called_once()
+
+
+class CourseStatsTests(TestCase):
+
+    def setUp(self):
+        owner = make_user('owner', role='Владелец')
+        self.course, self.other = make_course(owner), make_course(owner, title='Другой')
+        self.students = [make_user(f's{i}') for i in range(3)]
+
+    def assertNoDrift(self):
+        out = io.StringIO()
+        call_command('rebuild_course_stats', check=True, stdout=out)
+        self.assertIn('Расхождений нет', out.getvalue())
+
+    def test_lessons(self):
+        lesson = make_lesson(self.course)
+        make_lesson(self.course, title='Второй', video_time=timedelta(minutes=3))
+        lesson.video_time = timedelta(minutes=12)
+        lesson.save()
+        self.assertNoDrift()
+        lesson.course = self.other
+        lesson.save()
+        self.assertNoDrift()
+        lesson.delete()
+        self.assertNoDrift()
+        self.assertEqual(CourseStats.objects.get(course=self.course).total_duration, timedelta(minutes=3))
+
+    def test_reviews(self):
+        def review(student, rating=None):
+            return CourseReview.objects.create(user=student, course=self.course, city='-', region='-', rating=rating)
+
+        first = review(self.students[0], 5)
+        review(self.students[1], 3)
+        review(self.students[2])
+        first.rating = 4
+        first.save()
+        self.assertNoDrift()
+        first.course = self.other
+        first.save()
+        self.assertNoDrift()
+        first.delete()
+        self.assertNoDrift()
+
+    def test_favorites_and_purchases(self):
+        for student in self.students:
+            Favorite.objects.create(user=student, course=self.course)
+            PurchasedCourse.objects.create(user=student, course=self.course)
+        Favorite.objects.filter(user=self.students[0]).get().delete()
+        PurchasedCourse.objects.get(user=self.students[1]).delete()
+        self.assertNoDrift()
+        stats = CourseStats.objects.get(course=self.course)
+        self.assertEqual((stats.favorites_count, stats.purchases_count), (2, 2))
+
+    def test_loaddata_does_not_count_twice(self):
+        make_lesson(self.course)
+        PurchasedCourse.objects.create(user=self.students[0], course=self.course)
+        fixture = serializers.serialize('json', [
+            CourseStats.objects.get(course=self.course), *Lesson.objects.all(), *PurchasedCourse.objects.all()])
+        Lesson.objects.all().delete()
+        PurchasedCourse.objects.all().delete()
+        for obj in serializers.deserialize('json', fixture):
+            obj.save()
+        self.assertNoDrift()
+
+    def test_check_reports_drift_and_rebuild_fixes_it(self):
+        make_lesson(self.course)
+        CourseStats.objects.filter(course=self.course).update(lessons_count=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_course_stats', check=True, stdout=io.StringIO())
+        call_command('rebuild_course_stats', stdout=io.StringIO())
+        self.assertNoDrift()
+
+
+SAMPLE_MKV = os.path.join(settings.BASE_DIR, 'media', 'lesson_video', '2025-06-08_20-11-43.mkv')
+
+
+class MediaProbeTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        with open(SAMPLE_MKV, 'rb') as file:
+            self.sample = file.read()
+
+    def test_sample_mkv_duration(self):
+        self.assertEqual(probe_duration(SAMPLE_MKV), timedelta(seconds=3))
+        self.assertEqual(probe_duration(io.BytesIO(self.sample)), timedelta(seconds=3))
+
+    def test_file_position_is_restored(self):
+        source = io.BytesIO(self.sample)
+        probe_duration(source)
+        self.assertEqual(source.tell(), 0)
+
+    def test_truncated_or_corrupt_file_falls_back(self):
+        broken = [
+            b'',
+            self.sample[:8],
+            self.sample[:40],
+            self.sample[:4] + b'\x00' * 60,
+            b'\x00\x00\x00\x18ftypisom' + b'\xff' * 8,
+            os.urandom(256),
+        ]
+        for data in broken:
+            with self.subTest(data=data[:16]):
+                self.assertIsNone(probe_duration(io.BytesIO(data)))
+
+    def test_missing_path(self):
+        self.assertEqual(probe_path_seconds((7, os.path.join(self.media_root, 'nope.mkv'))), (7, None))
+
+    def test_backfill_video_time(self):
+        course = make_course(make_user('owner', role='Владелец'))
+        lesson = make_lesson(course, video_time=timedelta())
+        lesson.video.save('sample.mkv', ContentFile(self.sample), save=True)
+        broken = make_lesson(course, title='Битый', video_time=timedelta())
+        broken.video.save('broken.mkv', ContentFile(self.sample[:40]), save=True)
+
+        out = io.StringIO()
+        call_command('backfill_video_time', workers=1, stdout=out)
+
+        lesson.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual(lesson.video_time, timedelta(seconds=3))
+        self.assertEqual(broken.video_time, timedelta())
+        self.assertEqual(CourseStats.objects.get(course=course).total_duration, timedelta(seconds=3))
+        self.assertIn(f'Не распознаны: {broken.pk}', out.getvalue())
+        self.assertIn('обновлено: 1', out.getvalue())
+
+
+class PublicApiExportTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        patcher = mock.patch('logo_app.public_api.PUBLIC_API_ROOT', self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.category = Category.objects.create(category_name='Дизайн')
+
+    def read(self, filename):
+        with open(os.path.join(self.root, filename), 'rb') as file:
+            return file.read()
+
+    def exported(self):
+        return sorted(name for name in os.listdir(self.root) if name != MANIFEST_NAME)
+
+    def test_hashed_names_and_manifest(self):
+        manifest = export_public_api()
+        self.assertEqual(set(manifest), {name for name, _, _ in PUBLIC_API_EXPORTS})
+        self.assertEqual(json.loads(self.read(MANIFEST_NAME)), manifest)
+        for name, model, serializer_class in PUBLIC_API_EXPORTS:
+            content = render_export(model, serializer_class)
+            self.assertEqual(manifest[name], f'{name}.{hashlib.sha256(content).hexdigest()[:12]}.json')
+            self.assertEqual(self.read(manifest[name]), content)
+        self.assertEqual(json.loads(self.read(manifest['categories'])),
+                         [{'id': self.category.pk, 'category_name': 'Дизайн'}])
+
+    def test_reexport_after_edit(self):
+        first = export_public_api()
+        self.assertEqual(export_public_api(), first)
+
+        self.category.category_name = 'Музыка'
+        self.category.save()
+        second = export_public_api()
+        self.assertNotEqual(second['categories'], first['categories'])
+        self.assertEqual({k: v for k, v in second.items() if k != 'categories'},
+                         {k: v for k, v in first.items() if k != 'categories'})
+        self.assertIn('Музыка', self.read(second['categories']).decode())
+        # Предыдущая версия остаётся для клиентов со старым манифестом
+        self.assertIn(first['categories'], self.exported())
+
+        Category.objects.create(category_name='Кино')
+        third = export_public_api()
+        self.assertNotIn(first['categories'], self.exported())
+        self.assertIn(second['categories'], self.exported())
+        self.assertEqual(self.exported(), sorted(set(third.values()) | {second['categories']}))
+
+    def test_admin_exports_once_after_commit(self):
+        model_admin = CategoryAdmin(Category, django_admin.site)
+        other = Category.objects.create(category_name='Кино')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            model_admin.delete_model(None, other)
+            model_admin.delete_queryset(None, Category.objects.none())
+            self.assertFalse(os.path.exists(os.path.join(self.root, MANIFEST_NAME)))
+        self.assertEqual(len(callbacks), 1)
+        categories = json.loads(self.read(json.loads(self.read(MANIFEST_NAME))['categories']))
+        self.assertEqual([row['id'] for row in categories], [self.category.pk])
+
+
+class LegacyStudentSerializer(drf_serializers.ModelSerializer):
+    # Ответ «владельцы и студенты» до OwnerStudentRollup — эталон для сравнения
+    categories = drf_serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserProfile
+        fields = ['id', 'username', 'avatar', 'categories']
+
+    def get_categories(self, obj):
+        purchases = obj.purchased_courses.filter(course__owner=self.context['owner']).select_related('course__category')
+        categories = sorted({purchase.course.category for purchase in purchases}, key=lambda category: category.pk)
+        return CategorySerializer(categories, many=True).data
+
+
+class LegacyOwnerSerializer(drf_serializers.ModelSerializer):
+    students_paid = drf_serializers.SerializerMethodField()
+    students_free = drf_serializers.SerializerMethodField()
+    students_both = drf_serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserProfile
+        fields = ['id', 'username', 'avatar', 'students_paid', 'students_free', 'students_both']
+
+    def _students(self, owner, status):
+        return UserProfile.objects.filter(role='Студент', purchased_courses__course__owner=owner,
+                                          purchased_courses__course__status_course=status).distinct()
+
+    def _serialize(self, owner, students):
+        # Старые DISTINCT-запросы порядок не гарантировали — сравниваем в порядке id
+        return LegacyStudentSerializer(students.order_by('pk'), many=True, context={'owner': owner}).data
+
+    def get_students_paid(self, obj):
+        return self._serialize(obj, self._students(obj, 'Платно'))
+
+    def get_students_free(self, obj):
+        return self._serialize(obj, self._students(obj, 'Бесплатно'))
+
+    def get_students_both(self, obj):
+        return self._serialize(obj, self._students(obj, 'Платно') & self._students(obj, 'Бесплатно'))
+
+
+class OwnerStudentsReportTests(TestCase):
+
+    def setUp(self):
+        self.categories = [Category.objects.create(category_name=name) for name in ('Дизайн', 'Музыка', 'Кино')]
+        self.owners = []
+        self.serial = 0
+
+    def add_owner(self, students_per_kind=1):
+        index = len(self.owners)
+        owner = make_user(f'owner{index}', role='Владелец', avatar=f'user_avatar/owner{index}.png')
+        self.owners.append(owner)
+        design, music, cinema = self.categories
+        paid = [make_course(owner, f'Платный {index}-{n}', 'Платно', category) for n, category in enumerate((design, music))]
+        free = [make_course(owner, f'Бесплатный {index}-{n}', 'Бесплатно', category)
+                for n, category in enumerate((music, cinema))]
+        kinds = {'paid': paid, 'free': free, 'both': [paid[0], free[1]], 'all': paid + free}
+        for kind, courses in kinds.items():
+            for _ in range(students_per_kind):
+                self.serial += 1
+                student = make_user(f'{kind}{self.serial}')
+                for course in courses:
+                    PurchasedCourse.objects.create(user=student, course=course)
+        # Покупатель-не студент в отчёт не попадает
+        PurchasedCourse.objects.create(user=make_user(f'buyer{index}', role='Владелец'), course=paid[0])
+        return owner
+
+    def current(self):
+        owners = list(UserProfile.objects.filter(role='Владелец', pk__in=[owner.pk for owner in self.owners])
+                      .order_by('pk'))
+        report = owner_students_report([owner.pk for owner in owners])
+        return OwnerWithStudentsFullSerializer(owners, many=True, context={'students_report': report}).data
+
+    def legacy(self):
+        return LegacyOwnerSerializer(sorted(self.owners, key=lambda owner: owner.pk), many=True).data
+
+    def test_matches_legacy_serializer(self):
+        for _ in range(3):
+            self.add_owner(students_per_kind=2)
+        # Владелец без студентов
+        self.owners.append(make_user('lonely', role='Владелец'))
+        current = self.current()
+        self.assertEqual(current, self.legacy())
+
+        first = current[0]
+        self.assertEqual(len(first['students_paid']), 6)
+        self.assertEqual(len(first['students_free']), 6)
+        self.assertEqual(len(first['students_both']), 4)
+        both = first['students_both'][0]
+        self.assertEqual([category['category_name'] for category in both['categories']], ['Дизайн', 'Кино'])
+        self.assertEqual(current[-1]['students_paid'], [])
+
+    def test_query_count_does_not_grow(self):
+        self.add_owner()
+        with CaptureQueriesContext(connection) as small:
+            self.current()
+        for _ in range(3):
+            self.add_owner(students_per_kind=3)
+        with self.assertNumQueries(len(small)):
+            self.current()
+
+    def test_endpoint(self):
+        owner = self.add_owner()
+        response = auth_client(owner).get(reverse('owners-with-students'))
+        self.assertEqual(response.status_code, 200)
+        owners = UserProfile.objects.filter(role='Владелец').order_by('pk')
+        self.assertEqual(response.json(), json.loads(json.dumps(LegacyOwnerSerializer(owners, many=True).data)))
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    # Письма на адреса с «bad» не уходят, остальные — как в locmem
+    def send_messages(self, messages):
+        if any('bad' in address for message in messages for address in message.to):
+            raise ConnectionError('550 mailbox unavailable')
+        return super().send_messages(messages)
+
+
+class MailQueueTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        patcher = mock.patch('logo_app.mailqueue.timezone.now', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enqueue(self, *addresses):
+        return [enqueue_mail('Тема', 'Текст', None, [address]) for address in addresses]
+
+    def test_password_reset_only_enqueues(self):
+        user = make_user('student')
+        user.set_password('correct horse battery')
+        user.save()
+        response = APIClient().post(reverse('password_reset:reset-password-request'), {'email': user.email})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual((queued.status, queued.recipients), ('pending', [user.email]))
+
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, [user.email])
+        self.assertIn('token=', mail.outbox[0].body)
+
+    def test_drain_sends_batch_over_one_connection(self):
+        self.enqueue('a@example.com', 'b@example.com', 'c@example.com')
+        with mock.patch('logo_app.mailqueue.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(drain(batch_size=10), (3, 0))
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['a@example.com', 'b@example.com', 'c@example.com'])
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    def test_failed_send_is_rescheduled_with_backoff(self):
+        good, bad = self.enqueue('good@example.com', 'bad@example.com')
+        backend = FlakyEmailBackend()
+        with self.assertLogs('logo_app.mailqueue', 'WARNING') as logs:
+            self.assertEqual(drain(connection=backend), (1, 1))
+        self.assertIn(f'#{bad.pk}', logs.output[0])
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ('pending', 1))
+        self.assertEqual(bad.next_attempt_at, self.now + retry_delay(1))
+        self.assertIn('550', bad.last_error)
+        self.assertEqual([message.to for message in mail.outbox], [['good@example.com']])
+
+        # До срока письмо не берётся, после — повтор с удвоенной задержкой
+        self.assertEqual(drain(connection=backend), (0, 0))
+        self.now += retry_delay(1)
+        with self.assertLogs('logo_app.mailqueue', 'WARNING'):
+            self.assertEqual(drain(connection=backend), (0, 1))
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 2)
+        self.assertEqual(bad.next_attempt_at, self.now + retry_delay(2))
+        self.assertEqual(retry_delay(2), 2 * retry_delay(1))
+
+        with mock.patch('logo_app.mailqueue.MAIL_QUEUE_MAX_ATTEMPTS', 3), self.assertLogs('logo_app.mailqueue'):
+            self.now += retry_delay(2)
+            drain(connection=backend)
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ('failed', 3))
+
+    def test_leased_row_is_not_sent_twice(self):
+        first, second = self.enqueue('a@example.com', 'b@example.com')
+        claimed = claim_batch()
+        self.assertEqual([row.pk for row in claimed], [first.pk, second.pk])
+        # Второй воркер аренду не трогает
+        self.assertEqual(claim_batch(), [])
+        self.assertEqual(drain(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(send_batch(claimed[:1]), (1, 0))
+        # Воркер упал, не отправив второе письмо: после аренды его заберёт другой, первое — нет
+        self.now += MAIL_QUEUE_LEASE
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com'], ['b@example.com']])
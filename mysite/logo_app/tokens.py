@@ -0,0 +1,134 @@
+import hashlib
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .checks import cache_is_shared
+
+# Проверка refresh-токена по чёрному списку без запроса к БД в обычном случае.
+# Отозванные jti (ещё не истёкшие) лежат в фильтре Блума в памяти процесса:
+# «нет в фильтре» — точно не отозван; «есть» — перепроверяем в БД (ложные срабатывания ~1%).
+# Отзыв дописывает jti в общий журнал в кэше (номер записи — incr счётчика), процессы
+# добавляют в свой фильтр только новые записи. С БД фильтр строится при старте, при пропуске
+# в журнале (запись вытеснена или сброшен кэш) и когда фильтр переполнен.
+
+FILTER_LOG_KEY = 'token-blacklist:log'
+FILTER_ERROR_RATE = 0.01
+FILTER_MIN_CAPACITY = 1024
+FILTER_MAX_LAG = 10000  # отстали сильнее — дешевле перестроить, чем читать журнал
+
+
+def log_entry_key(number):
+    return f'{FILTER_LOG_KEY}:{number}'
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate=FILTER_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.capacity = capacity
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Двойное хэширование: k позиций из двух 64-битных половин одного blake2b
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        self.count += 1
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def filter_enabled():
+    # Журнал отзывов виден всем процессам только в общем кэше (Redis, Memcached...).
+    # С локальным кэшем фильтр безопасен лишь при одном процессе — включается явно
+    enabled = getattr(settings, 'TOKEN_BLACKLIST_FILTER', None)
+    if enabled is None:
+        return cache_is_shared()
+    return enabled
+
+
+_lock = threading.Lock()
+_filter = None
+_filter_seen = 0  # номер последней записи журнала, уже добавленной в фильтр
+
+
+def _log_head():
+    return cache.get(FILTER_LOG_KEY) or 0
+
+
+def build_filter():
+    jtis = list(BlacklistedToken.objects
+                .filter(token__expires_at__gt=timezone.now())
+                .values_list('token__jti', flat=True))
+    bloom = BloomFilter(max(len(jtis) * 2, FILTER_MIN_CAPACITY))
+    for jti in jtis:
+        bloom.add(jti)
+    return bloom
+
+
+def _catch_up(head):
+    global _filter, _filter_seen
+    if _filter is not None and _filter_seen < head <= _filter_seen + FILTER_MAX_LAG:
+        numbers = range(_filter_seen + 1, head + 1)
+        entries = cache.get_many([log_entry_key(number) for number in numbers])
+        if len(entries) == len(numbers) and _filter.count + len(entries) <= _filter.capacity:
+            for jti in entries.values():
+                _filter.add(jti)
+            _filter_seen = head
+            return
+    # Голова журнала читается до запроса к БД: отзыв, случившийся во время сборки,
+    # попадёт в фильтр ещё раз при следующей проверке — повтор безвреден
+    _filter, _filter_seen = build_filter(), head
+
+
+def revoked_filter():
+    head = _log_head()
+    if _filter is None or _filter_seen != head:
+        with _lock:
+            if _filter is None or _filter_seen != head:
+                _catch_up(head)
+    return _filter
+
+
+def log_revoked(jti):
+    """Дописывает jti в журнал отзывов; вызывать после коммита BlacklistedToken."""
+    try:
+        number = cache.incr(FILTER_LOG_KEY)
+    except ValueError:
+        cache.add(FILTER_LOG_KEY, 0, None)
+        number = cache.incr(FILTER_LOG_KEY)
+    # Запись нужна, пока токен не истёк: позже он отвергается и без чёрного списка
+    cache.set(log_entry_key(number), jti, int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()))
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """RefreshToken, проверяющий чёрный список через фильтр Блума (см. выше)."""
+
+    def check_blacklist(self):
+        if filter_enabled() and self.payload[api_settings.JTI_CLAIM] not in revoked_filter():
+            return
+        super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        if filter_enabled():
+            # Остальные процессы добавят jti из журнала при следующей проверке
+            jti = self.payload[api_settings.JTI_CLAIM]
+            transaction.on_commit(lambda: log_revoked(jti))
+        return result
@@ -0,0 +1,148 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .media_probe import probe_duration
+from .models import LessonUpload
+
+# Докачиваемая загрузка видео уроков (в духе протокола tus):
+# создать сессию -> PATCH кусками по смещению -> завершить.
+# Куски пишутся прямо в файл на диске, в память целиком не читаются.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadOffsetMismatch(Exception):
+    pass
+
+
+def part_path(upload):
+    return os.path.join(settings.LESSON_UPLOAD_TEMP_DIR, f'{upload.pk}.part')
+
+
+@contextmanager
+def locked_part(upload):
+    """
+    Файл .part под эксклюзивной блокировкой (flock). Занят другим PATCH —
+    сразу UploadOffsetMismatch: клиент перечитает смещение и повторит.
+    Блокировку берём до записи, поэтому проигравший запрос не трогает байты победителя.
+    """
+    os.makedirs(settings.LESSON_UPLOAD_TEMP_DIR, exist_ok=True)
+    fd = os.open(part_path(upload), os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(fd, 'r+b') as part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadOffsetMismatch(upload.offset)
+        try:
+            yield part
+        finally:
+            fcntl.flock(part, fcntl.LOCK_UN)
+
+
+def write_chunk(upload, offset, stream, length=None):
+    """
+    Дописывает данные из stream с позиции offset и возвращает новое смещение.
+    Смещение должно совпадать с сохранённым — иначе UploadOffsetMismatch (409).
+    """
+    if offset != upload.offset:
+        raise UploadOffsetMismatch(upload.offset)
+
+    remaining = upload.size - offset if length is None else min(length, upload.size - offset)
+    written = 0
+    with locked_part(upload) as part:
+        # Под блокировкой перечитываем смещение: до неё его мог сдвинуть другой запрос
+        current = LessonUpload.objects.filter(pk=upload.pk).values_list('offset', flat=True).first()
+        if current != offset:
+            raise UploadOffsetMismatch(current)
+        part.seek(offset)
+        while remaining > 0:
+            data = stream.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            part.write(data)
+            written += len(data)
+            remaining -= len(data)
+        part.truncate(offset + written)
+        part.flush()
+
+        new_offset = offset + written
+        LessonUpload.objects.filter(pk=upload.pk, offset=offset).update(offset=new_offset)
+    upload.offset = new_offset
+    return new_offset
+
+
+class _PartFile(File):
+    # FileSystemStorage переносит файл с temporary_file_path() через rename, без копирования
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def finish_upload(upload, serializer):
+    """Атомарно создаёт Lesson с собранным файлом; при ошибке ссылка на файл в хранилище снимается."""
+    path = part_path(upload)
+    lesson = serializer.Meta.model(**serializer.validated_data)
+    if not lesson.video_time:
+        lesson.video_time = probe_duration(path)
+        if lesson.video_time is None:
+            raise ValidationError({'video_time': 'Не удалось определить длительность видео, укажите её вручную.'})
+    with open(path, 'rb') as part:
+        lesson.video.save(upload.filename, _PartFile(part), save=False)
+    try:
+        with transaction.atomic():
+            lesson.save()
+            upload.lesson = lesson
+            upload.save(update_fields=['lesson'])
+    except Exception:
+        lesson.video.delete(save=False)
+        raise
+    if os.path.exists(path):
+        os.remove(path)
+    return lesson
+
+
+def discard_upload(upload):
+    path = part_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+    upload.delete()
+
+
+def expire_uploads(older_than):
+    """
+    Удаляет незавершённые загрузки старше older_than (timedelta) и их файлы .part,
+    а также файлы .part без строки в БД. Возвращает (загрузок, файлов).
+    """
+    cutoff = timezone.now() - older_than
+
+    def idle(path):
+        # Загрузку, в которую ещё пишут, не трогаем — смотрим на время последнего куска
+        if not os.path.exists(path):
+            return True
+        return datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc) < cutoff
+
+    expired = 0
+    for upload in LessonUpload.objects.filter(lesson__isnull=True, created_date__lt=cutoff).iterator():
+        if idle(part_path(upload)):
+            discard_upload(upload)
+            expired += 1
+
+    removed = 0
+    directory = settings.LESSON_UPLOAD_TEMP_DIR
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            if not filename.endswith('.part') or not idle(path):
+                continue
+            pk = filename.removesuffix('.part')
+            if not LessonUpload.objects.filter(pk=pk, lesson__isnull=True).exists():
+                os.remove(path)
+                removed += 1
+    return expired, removed
@@ -14,9 +14,13 @@ urlpatterns = [
     path('user/<int:pk>', UserProfileDetailAPIView.as_view(), name='user_detail'),
     path('user/edit/<int:pk>', UserProfileEditAPIView.as_view(), name='user_edit'),
     path('register/', RegisterView.as_view(), name='register'),
+    path('user/import/', UserImportAPIView.as_view(), name='user-import'),
+    path('user/import/<uuid:pk>/', UserImportJobAPIView.as_view(), name='user-import-detail'),
     path('login/', CustomLoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='login'),
+    path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
 
+    path('landing/', LandingAPIView.as_view(), name='landing'),
     path('home/', HomeAPIView.as_view(), name='home'),
     path('whycourse/', WhyCourseAPIView.as_view(), name='whycourse'),
     path('aboutus/', AboutUsAPIView.as_view(), name='aboutus'),
@@ -26,6 +30,7 @@ urlpatterns = [
 
     path('courses/', CourseListAPIView.as_view(), name='course_list'),
     path('courses/<int:pk>', CourseDetailAPIView.as_view(), name='course_detail'),
+    path('courses/search/', CourseSearchAPIView.as_view(), name='course_search'),
     path('courses/buy/', PurchaseCourseAPIView.as_view(), name='purchase-course'),
 
     path('courses/create/', CourseCreateAPIView.as_view(), name='course_create'),
@@ -33,7 +38,11 @@ urlpatterns = [
 
     path('lesson/create/', LessonCreateAPIView.as_view(), name='lesson-create'),
     path('lesson/create/<int:pk>', LessonEditAPIView.as_view(), name='lesson-edit'),
+    path('lesson/uploads/', LessonUploadCreateAPIView.as_view(), name='lesson-upload-create'),
+    path('lesson/uploads/<uuid:pk>', LessonUploadAPIView.as_view(), name='lesson-upload'),
+    path('lesson/uploads/<uuid:pk>/finish', LessonUploadFinishAPIView.as_view(), name='lesson-upload-finish'),
     path('lesson/<int:pk>', LessonDetailAPIView.as_view(), name='lesson-detail'),
+    path('lesson/<int:pk>/video', LessonVideoAPIView.as_view(), name='lesson-video'),
     path('lesson/', LessonListAPIView.as_view(), name='lesson-list'),
 
     path('favorite/create', FavoriteCreateAPIView.as_view(), name='favorite_create'),
@@ -53,6 +62,7 @@ urlpatterns = [
     path('password_reset/', include('django_rest_passwordreset.urls', namespace='password_reset')),
 
     path('owners-with-students/', OwnersWithStudentsAPIView.as_view(), name='owners-with-students'),
+    path('owner/students/export', OwnerStudentsExportAPIView.as_view(), name='owner-students-export'),
     path('owner/', OwnerListAPIView.as_view(), name='owner_list'),
     path('owner/<int:pk>', OwnerDetailAPIView.as_view(), name='owner_detail'),
 
@@ -0,0 +1,229 @@
+import codecs
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import USER_ROLE, UserImportJob, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Массовый импорт пользователей из CSV/NDJSON (username, email, password[, role]).
+# Дорогая часть — хэширование паролей (PBKDF2 — около миллиона итераций на пароль),
+# поэтому оно идёт в пуле процессов на все ядра; вставка — bulk_create пачками.
+# Строки с ошибками и конфликтами (username/email уже заняты в БД или в самом файле)
+# не прерывают импорт, а попадают в отчёт с номером строки.
+# bulk_create не шлёт post_save — для новых пользователей без аватара это ничего не меняет.
+# Через API импорт не идёт в запросе: файл сохраняется во временный каталог, задание
+# UserImportJob выполняет воркер run_user_imports, отчёт читается по /user/import/<id>/.
+
+USER_IMPORT_BATCH_SIZE = getattr(settings, 'USER_IMPORT_BATCH_SIZE', 1000)
+USER_IMPORT_WORKERS = getattr(settings, 'USER_IMPORT_WORKERS', None)  # None — по числу ядер
+USER_IMPORT_FORMATS = ('csv', 'ndjson')
+
+ROLES = {role for role, _ in USER_ROLE}
+TEXT_FIELDS = ('username', 'email', 'password', 'role')
+
+
+def read_rows(file, input_format):
+    """Строки файла как словари; file — бинарный (загрузка, open(..., 'rb'))."""
+    text = codecs.iterdecode(file, 'utf-8-sig')
+    if input_format == 'csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else {'_invalid': line[:100]}
+
+
+def _validate(row):
+    if '_invalid' in row:
+        return {'row': 'Строка не является JSON-объектом'}
+    # В NDJSON значения могут быть числами, списками... — дальше такие поля не проверяем
+    errors = {field: 'Должно быть строкой' for field in TEXT_FIELDS
+              if row.get(field) is not None and not isinstance(row[field], str)}
+    if errors:
+        return errors
+    username_field = UserProfile._meta.get_field('username')
+    username = (row.get('username') or '').strip()
+    email = (row.get('email') or '').strip()
+    role = (row.get('role') or '').strip() or 'Студент'
+    if not username:
+        errors['username'] = 'Обязательное поле'
+    else:
+        try:
+            username_field.clean(username, None)
+        except ValidationError as error:
+            errors['username'] = ' '.join(error.messages)
+    if not email:
+        errors['email'] = 'Обязательное поле'
+    else:
+        try:
+            validate_email(email)
+        except ValidationError as error:
+            errors['email'] = ' '.join(error.messages)
+    if not row.get('password'):
+        errors['password'] = 'Обязательное поле'
+    if role not in ROLES:
+        errors['role'] = f'Допустимые значения: {", ".join(sorted(ROLES))}'
+    return errors
+
+
+def hash_passwords(passwords, workers=USER_IMPORT_WORKERS):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    # Дочерние процессы (spawn/forkserver) получают DJANGO_SETTINGS_MODULE из окружения;
+    # рабочие функции — make_password и django.setup, модуль с моделями им не импортируется
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+class ImportReport:
+    __slots__ = ('created', 'errors')
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # [{'row': номер строки, 'errors': {поле: текст}}]
+
+    def reject(self, number, errors):
+        self.errors.append({'row': number, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'errors': sorted(self.errors, key=lambda error: error['row'])}
+
+
+def _taken(batch):
+    # Занятые в БД username и email (email без учёта регистра) — два запроса на пачку
+    usernames = set(UserProfile.objects
+                    .filter(username__in=[row['username'] for _, row in batch])
+                    .values_list('username', flat=True))
+    emails = set(UserProfile.objects
+                 .annotate(email_key=Lower('email'))
+                 .filter(email_key__in=[row['email'].lower() for _, row in batch])
+                 .values_list('email_key', flat=True))
+    return usernames, emails
+
+
+def _conflicts(row, usernames, emails):
+    errors = {}
+    if row['username'] in usernames:
+        errors['username'] = 'Пользователь с таким username уже существует'
+    if row['email'].lower() in emails:
+        errors['email'] = 'Пользователь с таким email уже существует'
+    return errors
+
+
+def _insert(batch, report):
+    usernames, emails = _taken(batch)
+    users = []
+    for number, row in batch:
+        errors = _conflicts(row, usernames, emails)
+        if errors:
+            report.reject(number, errors)
+        else:
+            users.append((number, row, UserProfile(username=row['username'], email=row['email'],
+                                                   role=row['role'], password=row['password'])))
+    try:
+        with transaction.atomic():
+            UserProfile.objects.bulk_create([user for _, _, user in users])
+        report.created += len(users)
+    except IntegrityError:
+        # Кто-то успел занять username/email между проверкой и вставкой — по одной, чтобы найти строку
+        for number, row, user in users:
+            try:
+                with transaction.atomic():
+                    user.save(force_insert=True)
+                report.created += 1
+            except IntegrityError as error:
+                # Проверяем заново, что именно занято; иначе — текст ограничения из БД
+                report.reject(number, _conflicts(row, *_taken([(number, row)])) or {'row': str(error)})
+
+
+def import_users(rows, batch_size=USER_IMPORT_BATCH_SIZE, workers=USER_IMPORT_WORKERS):
+    """Импортирует строки (словари); номера строк в отчёте — с 1, без заголовка CSV."""
+    report = ImportReport()
+    valid, seen_usernames, seen_emails = [], set(), set()
+    for number, row in enumerate(rows, start=1):
+        errors = _validate(row)
+        if not errors:
+            row = {'username': row['username'].strip(), 'email': row['email'].strip(),
+                   'password': row['password'], 'role': (row.get('role') or '').strip() or 'Студент'}
+            if row['username'] in seen_usernames:
+                errors['username'] = 'Повторяется в файле'
+            if row['email'].lower() in seen_emails:
+                errors['email'] = 'Повторяется в файле'
+        if errors:
+            report.reject(number, errors)
+            continue
+        seen_usernames.add(row['username'])
+        seen_emails.add(row['email'].lower())
+        valid.append((number, row))
+
+    hashes = hash_passwords([row['password'] for _, row in valid], workers)
+    for (_, row), password in zip(valid, hashes):
+        row['password'] = password
+    for start in range(0, len(valid), batch_size):
+        _insert(valid[start:start + batch_size], report)
+    return report
+
+
+def import_path(job):
+    return os.path.join(settings.USER_IMPORT_TEMP_DIR, f'{job.pk}.{job.input_format}')
+
+
+def enqueue_import(upload, input_format, user=None):
+    """Сохраняет загруженный файл и ставит задание в очередь run_user_imports."""
+    job = UserImportJob(input_format=input_format, created_by=user)
+    os.makedirs(settings.USER_IMPORT_TEMP_DIR, exist_ok=True)
+    with open(import_path(job), 'wb') as file:
+        for chunk in upload.chunks():
+            file.write(chunk)
+    job.save(force_insert=True)
+    return job
+
+
+def claim_job():
+    with transaction.atomic():
+        # skip_locked: параллельные воркеры на PostgreSQL не берут одно задание
+        job = (UserImportJob.objects.select_for_update(skip_locked=True)
+               .filter(status='pending').order_by('created_date').first())
+        if job is not None:
+            job.status = 'running'
+            job.save(update_fields=['status'])
+    return job
+
+
+def run_job(job, batch_size=USER_IMPORT_BATCH_SIZE, workers=USER_IMPORT_WORKERS):
+    path = import_path(job)
+    try:
+        with open(path, 'rb') as file:
+            job.report = import_users(read_rows(file, job.input_format), batch_size, workers).as_dict()
+        job.status = 'done'
+    except Exception as error:
+        logger.exception('Импорт пользователей %s не выполнен', job.pk)
+        job.report, job.status = {'error': str(error)}, 'failed'
+    finally:
+        # В файле пароли открытым текстом — не оставляем его на диске
+        if os.path.exists(path):
+            os.remove(path)
+    job.finished_date = timezone.now()
+    job.save(update_fields=['report', 'status', 'finished_date'])
+    return job
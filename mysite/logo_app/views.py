@@ -3,15 +3,32 @@ from .models import *
 from rest_framework import status, viewsets, generics, permissions
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.functional import cached_property
 from rest_framework.exceptions import ValidationError
-from .permissions import UserEdit, CheckUserOwner, CheckUserStudent, IsLessonOpen, IsSelfOrCourseOwner
+from .permissions import UserEdit, CheckUserOwner, CheckUserStudent, IsLessonOpen, IsSelfOrCourseOwner, IsStaff
 from rest_framework.views import APIView
 from django.contrib.auth import update_session_auth_hash
 from rest_framework.exceptions import PermissionDenied
+from .pagination import KeysetCursorPagination
+from .search import search_course_ids
+from .filters import parse_course_filters, filter_courses, course_facets
+from .counters import lesson_views
+from .streaming import serve_protected_file
+from .uploads import UploadOffsetMismatch, write_chunk, finish_upload, discard_upload
+from .landing import landing_snapshot
+from .prefetch import PrefetchPlanMixin
+from .reports import owner_students_report
+from .exports import EXPORT_FORMATS, roster_response
+from .authentication import profile_of
+from .tokens import CachedBlacklistRefreshToken
+from .userimport import USER_IMPORT_FORMATS, enqueue_import
 
 
 
@@ -25,6 +42,37 @@ class RegisterView(generics.CreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class UserImportAPIView(APIView):
+    """
+    Массовый импорт пользователей (только staff): multipart-поле file с CSV или NDJSON,
+    формат — ?input=csv|ndjson, по умолчанию по расширению файла. Хэширование паролей долгое,
+    поэтому импорт ставится в очередь (воркер run_user_imports): ответ 202 со ссылкой на задание,
+    где после выполнения — число созданных и ошибки по номерам строк.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsStaff]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Обязательное поле'})
+        input_format = request.query_params.get('input') or upload.name.rsplit('.', 1)[-1].lower()
+        if input_format not in USER_IMPORT_FORMATS:
+            raise ValidationError({'input': f'Допустимые значения: {", ".join(USER_IMPORT_FORMATS)}'})
+        job = enqueue_import(upload, input_format, profile_of(request.user))
+        url = request.build_absolute_uri(reverse('user-import-detail', args=[job.pk]))
+        return Response({'id': job.pk, 'status': job.status, 'url': url},
+                        status=status.HTTP_202_ACCEPTED, headers={'Location': url})
+
+
+class UserImportJobAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsStaff]
+
+    def get(self, request, pk):
+        job = get_object_or_404(UserImportJob, pk=pk)
+        return Response({'id': job.pk, 'status': job.status, 'report': job.report,
+                         'created_date': job.created_date, 'finished_date': job.finished_date})
+
+
 class CustomLoginView(generics.GenericAPIView):
     serializer_class = CustomLoginSerializer
 
@@ -47,19 +95,22 @@ class LogoutView(generics.GenericAPIView):
 
         try:
             refresh_token = serializer.validated_data['refresh']
-            token = RefreshToken(refresh_token)
+            token = CachedBlacklistRefreshToken(refresh_token)
             token.blacklist()
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception:
             return Response({'detail': 'Невалидный токен'}, status=status.HTTP_400_BAD_REQUEST)
 
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def change_password(request):
     if request.method == 'PUT':
         serializer = ChangePasswordSerializer(data=request.data)
         if serializer.is_valid():
-            user = request.user
+            user = profile_of(request.user)
             if user.check_password(serializer.data.get('old_password')):
                 user.set_password(serializer.data.get('new_password'))
                 user.save()
@@ -70,7 +121,7 @@ def change_password(request):
 
 
 
-class UserProfileListAPIView(generics.ListAPIView):
+class UserProfileListAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileListSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -84,13 +135,13 @@ class UserProfileListAPIView(generics.ListAPIView):
         return UserProfile.objects.none()
 
 
-class UserProfileDetailAPIView(generics.RetrieveAPIView):
+class UserProfileDetailAPIView(PrefetchPlanMixin, generics.RetrieveAPIView):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileListSerializer
     permission_classes = [permissions.IsAuthenticated, IsSelfOrCourseOwner]
 
 
-class UserProfileEditAPIView(generics.RetrieveUpdateAPIView):
+class UserProfileEditAPIView(PrefetchPlanMixin, generics.RetrieveUpdateAPIView):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileDetailSerializer
     permission_classes = [permissions.IsAuthenticated, UserEdit]
@@ -103,68 +154,115 @@ class UserProfileEditAPIView(generics.RetrieveUpdateAPIView):
         # Для владельцев — сразу 404
         return UserProfile.objects.none()
 
-class HomeAPIView(generics.ListAPIView):
+class HomeAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = Home.objects.all()
     serializer_class = HomeSerializers
 
-class WhyCourseAPIView(generics.ListAPIView):
+class WhyCourseAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = WhyCourse.objects.all()
     serializer_class = WhyCourseSerializer
 
-class TitleForCourseAPIView(generics.ListAPIView):
+class TitleForCourseAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = TitleForCourse.objects.all()
     serializer_class = TitleForCourseSerializer
 
-class TitleForReviewAPIView(generics.ListAPIView):
+class TitleForReviewAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = TitleForReview.objects.all()
     serializer_class = TitleForReviewSerializer
 
-class EmailTitleAPIView(generics.ListAPIView):
+class EmailTitleAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = EmailTitle.objects.all()
     serializer_class = EmailTitleSerializer
 
-class AboutUsAPIView(generics.ListAPIView):
+class AboutUsAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = AboutUs.objects.all()
     serializer_class = AboutUsSerializer
 
-class TitleCourseAPIView(generics.ListAPIView):
+class TitleCourseAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = TitleCourse.objects.all()
     serializer_class = TitleCourseSerializer
 
-class CourseDetailAPIView(generics.RetrieveAPIView):
+class LandingAPIView(APIView):
+    """
+    Все блоки главной страницы одним запросом (home, whycourse, aboutus,
+    title_for_course, titlereview, titlecourse, titleemail) из кэша.
+    """
+
+    def get(self, request):
+        return Response(landing_snapshot(request))
+
+class CourseDetailAPIView(PrefetchPlanMixin, generics.RetrieveAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseDetailSerializer
 
-class LessonListAPIView(generics.ListAPIView):
+class LessonListAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonListSerializer
+    pagination_class = KeysetCursorPagination
 
-class LessonDetailAPIView(generics.RetrieveAPIView):
+class LessonDetailAPIView(PrefetchPlanMixin, generics.RetrieveAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonDetailSerializer
     permission_classes = [IsLessonOpen]
 
     def retrieve(self, request, *args, **kwargs):
         lesson = self.get_object()
-        # Увеличиваем счётчик просмотров
-        Lesson.objects.filter(pk=lesson.pk).update(views=lesson.views + 1)
-        # Обновим поле в объекте перед сериализацией
-        lesson.views += 1
+        # Просмотр копится в памяти и сохраняется пачкой (logo_app.counters);
+        # показываем сохранённое значение плюс ещё не сброшенные просмотры
+        lesson.views += lesson_views.hit(lesson.pk)
         serializer = self.get_serializer(lesson)
         return Response(serializer.data)
 
-class CourseListAPIView(generics.ListAPIView):
+class LessonVideoAPIView(generics.RetrieveAPIView):
+    queryset = Lesson.objects.only('id', 'status', 'video')
+    permission_classes = [IsLessonOpen]
+
+    def retrieve(self, request, *args, **kwargs):
+        # Сначала проверка доступа (get_object вызывает IsLessonOpen), потом отдача файла
+        lesson = self.get_object()
+        if not lesson.video:
+            raise Http404
+        return serve_protected_file(request, lesson.video)
+
+class CourseListAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseListSerializer
+    pagination_class = KeysetCursorPagination
+
+    @cached_property
+    def course_filters(self):
+        # Разбираем параметры один раз: они нужны и queryset'у, и фасетам
+        return parse_course_filters(self.request.query_params)
+
+    def get_queryset(self):
+        return filter_courses(Course.objects.for_catalog(self.request.user), self.course_filters)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = course_facets(Course.objects.all(), self.course_filters)
+        return response
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})
         return context
 
-class FavoriteListAPIView(generics.ListAPIView):
+class CourseSearchAPIView(generics.ListAPIView):
+    serializer_class = CourseListSerializer
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            return []
+        # Индекс отдаёт id по релевантности, сами курсы — одним запросом
+        ids = search_course_ids(query)
+        courses = Course.objects.for_catalog(self.request.user).in_bulk(ids)
+        return [courses[pk] for pk in ids if pk in courses]
+
+class FavoriteListAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = Favorite.objects.all()
     serializer_class = FavoriteListSerializer
+    pagination_class = KeysetCursorPagination
 
 class FavoriteCreateAPIView(generics.CreateAPIView):
     serializer_class = FavoriteSerializer
@@ -175,7 +273,7 @@ class FavoriteDeleteAPIView(generics.DestroyAPIView):
 
     def delete(self, request, *args, **kwargs):
         course_id = kwargs.get('course_id')
-        favorite = Favorite.objects.filter(user=request.user, course_id=course_id).first()
+        favorite = Favorite.objects.filter(user_id=request.user.pk, course_id=course_id).first()
         if favorite:
             favorite.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -195,13 +293,14 @@ class CourseReviewCreateAPIView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         try:
-            serializer.save(user=self.request.user)
+            serializer.save(user_id=self.request.user.pk)
         except IntegrityError:
             raise ValidationError("Вы уже оставили отзыв для этого курса.")
 
-class CourseReviewListAPIView(generics.ListAPIView):
+class CourseReviewListAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = CourseReview.objects.all()
     serializer_class = CourseReviewListSerializer
+    pagination_class = KeysetCursorPagination
 
 class LessonReviewCreateAPIView(generics.CreateAPIView):
     queryset = LessonReview.objects.all()
@@ -211,13 +310,14 @@ class LessonReviewCreateAPIView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         try:
-            serializer.save(user=self.request.user)
+            serializer.save(user_id=self.request.user.pk)
         except IntegrityError:
             raise ValidationError("Вы уже оставили отзыв для этого курса.")
 
-class LessonReviewListAPIView(generics.ListAPIView):
+class LessonReviewListAPIView(PrefetchPlanMixin, generics.ListAPIView):
     queryset = LessonReview.objects.all()
     serializer_class = LessonReviewListSerializer
+    pagination_class = KeysetCursorPagination
 
 class EmailCreateAPIView(generics.CreateAPIView):
     serializer_class = EmailCreateSerializer
@@ -232,32 +332,125 @@ from rest_framework.response import Response
 
 class OwnersWithStudentsAPIView(APIView):
     def get(self, request):
-        owners = UserProfile.objects.filter(role='Владелец')
-        serializer = OwnerWithStudentsFullSerializer(owners, many=True)
+        owners = list(UserProfile.objects.filter(role='Владелец'))
+        report = owner_students_report([owner.pk for owner in owners])
+        serializer = OwnerWithStudentsFullSerializer(owners, many=True, context={'students_report': report})
         return Response(serializer.data)
     permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
 
 
 
+class OwnerStudentsExportAPIView(APIView):
+    """
+    Потоковая выгрузка покупок курсов владельца: ?output=csv (по умолчанию) или ?output=ndjson.
+    Параметр не называется format — его занимает DRF для выбора рендерера.
+    """
+    permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
+
+    def get(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({'output': f'Допустимые значения: {", ".join(EXPORT_FORMATS)}'})
+        return roster_response(request.user.pk, output)
+
+
 class CourseCreateAPIView(generics.CreateAPIView):
     serializer_class = CourseCreateSerializers
     permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
 
-class CourseEditAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CourseEditAPIView(PrefetchPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseCreateSerializers
     permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
 
+    def perform_update(self, serializer):
+        # Смена статуса/категории пересчитывает сводку владельца в той же транзакции
+        with transaction.atomic():
+            serializer.save()
+
 class LessonCreateAPIView(generics.CreateAPIView):
     serializer_class = LessonCreateSerializer
     permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
 
-class LessonEditAPIView(generics.RetrieveUpdateDestroyAPIView):
+class LessonUploadCreateAPIView(generics.CreateAPIView):
+    serializer_class = LessonUploadSerializer
+    permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response['Location'] = reverse('lesson-upload', args=[response.data['id']])
+        return response
+
+class LessonUploadAPIView(APIView):
+    """
+    HEAD/GET — текущее смещение, PATCH — дописать кусок
+    (Content-Type: application/offset+octet-stream, заголовок Upload-Offset),
+    DELETE — отменить загрузку.
+    """
+    permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
+
+    def get_object(self, pk):
+        return get_object_or_404(LessonUpload, pk=pk, owner_id=self.request.user.pk, lesson__isnull=True)
+
+    def _offset_response(self, upload, with_body=True):
+        if with_body:
+            response = Response(LessonUploadSerializer(upload).data)
+        else:
+            response = Response(status=status.HTTP_204_NO_CONTENT)
+        response['Upload-Offset'] = str(upload.offset)
+        response['Upload-Length'] = str(upload.size)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def get(self, request, pk):
+        return self._offset_response(self.get_object(pk))
+
+    def head(self, request, pk):
+        return self._offset_response(self.get_object(pk))
+
+    def patch(self, request, pk):
+        upload = self.get_object(pk)
+        if request.content_type != 'application/offset+octet-stream':
+            return Response({'detail': 'Ожидается Content-Type: application/offset+octet-stream'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response({'detail': 'Нужен заголовок Upload-Offset'}, status=status.HTTP_400_BAD_REQUEST)
+        length = request.META.get('CONTENT_LENGTH')
+        try:
+            # Читаем поток запроса напрямую, request.data не трогаем
+            write_chunk(upload, offset, request._request, int(length) if length else None)
+        except UploadOffsetMismatch as error:
+            response = Response({'detail': 'Смещение не совпадает'}, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = str(error.args[0])
+            return response
+        return self._offset_response(upload, with_body=False)
+
+    def delete(self, request, pk):
+        discard_upload(self.get_object(pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class LessonUploadFinishAPIView(generics.GenericAPIView):
+    serializer_class = LessonUploadFinishSerializer
+    permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
+
+    def post(self, request, pk):
+        upload = get_object_or_404(LessonUpload, pk=pk, owner_id=request.user.pk, lesson__isnull=True)
+        if not upload.is_complete:
+            return Response({'detail': f'Загружено {upload.offset} из {upload.size} байт'},
+                            status=status.HTTP_409_CONFLICT)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lesson = finish_upload(upload, serializer)
+        return Response(self.get_serializer(lesson).data, status=status.HTTP_201_CREATED)
+
+class LessonEditAPIView(PrefetchPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Lesson.objects.all()
     serializer_class = LessonCreateSerializer
     permission_classes = [permissions.IsAuthenticated, CheckUserOwner]
 
-class OwnerListAPIView(generics.ListAPIView):
+class OwnerListAPIView(PrefetchPlanMixin, generics.ListAPIView):
     serializer_class = OwnerListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -276,7 +469,7 @@ class OwnerListAPIView(generics.ListAPIView):
         return UserProfile.objects.none()
 
 
-class OwnerDetailAPIView(generics.RetrieveUpdateAPIView):
+class OwnerDetailAPIView(PrefetchPlanMixin, generics.RetrieveUpdateAPIView):
     queryset = UserProfile.objects.all()
     serializer_class = OwnerListSerializer
     permission_classes = [permissions.IsAuthenticated, UserEdit]
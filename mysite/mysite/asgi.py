@@ -10,16 +10,20 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-from channels.auth import AuthMiddlewareStack
-from cчhat.routing import websocket_urlpatterns
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+# Django нужно инициализировать до импорта маршрутов: они тянут модели чата
+django_asgi_app = get_asgi_application()
+
+from chat.middleware import JWTAuthMiddlewareStack
+from chat.routing import websocket_urlpatterns
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
-        "websocket": AuthMiddlewareStack(
+        "http": django_asgi_app,
+        # Пользователь — по access-токену (?token= или Authorization: Bearer), иначе по сессии
+        "websocket": JWTAuthMiddlewareStack(
             URLRouter(
                 websocket_urlpatterns
             )
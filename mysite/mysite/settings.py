@@ -98,6 +98,17 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Общий кэш всех процессов (версия снимка главной, фильтр отозванных токенов).
+# Без REDIS_URL — кэш в памяти процесса: годится только для одного процесса (runserver)
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -144,10 +155,43 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Статический JSON публичного контента (logo_app.public_api), отдаёт nginx
+PUBLIC_API_ROOT = os.path.join(STATIC_ROOT, 'public_api')
 
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# Видео уроков — вне MEDIA_ROOT: по /media/ их не скачать, только через /lesson/<id>/video
+PROTECTED_MEDIA_ROOT = os.path.join(BASE_DIR, 'protected_media')
+
+# Медиа хранятся по хэшу содержимого (logo_app.storage), одинаковые файлы не дублируются
+STORAGES = {
+    'default': {
+        'BACKEND': 'logo_app.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Внутренний location nginx для X-Accel-Redirect (например, /protected_media/).
+# Пусто — видео уроков отдаёт сам Django с поддержкой Range.
+LESSON_VIDEO_ACCEL_PREFIX = os.getenv('LESSON_VIDEO_ACCEL_PREFIX', '')
+
+# Докачиваемая загрузка видео: куда складывать недокачанные файлы и предельный размер
+LESSON_UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'upload_tmp')
+LESSON_UPLOAD_MAX_SIZE = 10 * 1024 ** 3
+
+# Ширины уменьшенных копий картинок (logo_app.images)
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1280)
+# Сколько держать в кэше карту «файл -> копии»; по истечении она строится заново по файлам на диске
+IMAGE_VARIANTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько общий кэш (Redis) помнит результат проверки доступа; покупки сбрасывают его сразу
+ACCESS_CACHE_TIMEOUT = 300
+
+# Время жизни снимка главной страницы; при изменениях в админке снимок сбрасывается сразу
+LANDING_CACHE_TIMEOUT = 60 * 60 * 24
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -165,11 +209,25 @@ SIMPLE_JWT = {
 
 }
 
-# REST_FRAMEWORK = {
-#     'DEFAULT_AUTHENTICATION_CLASSES': (
-#         'rest_framework_simplejwt.authentication.JWTAuthentication',
-#     ),
-# }
+# Фильтр Блума для чёрного списка refresh-токенов (logo_app.tokens): по умолчанию включается
+# только с общим кэшем; True — можно и с локальным, если процесс один
+# TOKEN_BLACKLIST_FILTER = True
+
+REST_FRAMEWORK = {
+    # JWT без обращения к БД (logo_app.authentication); сессии — для админки и browsable API
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'logo_app.authentication.StatelessJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ),
+}
+
+# Курсорная пагинация списков (logo_app.pagination)
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Счётчик просмотров уроков: сброс в БД раз в N секунд или после M просмотров
+LESSON_VIEWS_FLUSH_INTERVAL = 5
+LESSON_VIEWS_FLUSH_THRESHOLD = 100
 
 AUTHENTICATION_BACKENDS = [
  'django.contrib.auth.backends.ModelBackend',
@@ -210,3 +268,24 @@ EMAIL_HOST_USER = 'kadyrov2006@gmail.com'          # твой Gmail
 EMAIL_HOST_PASSWORD = 'ufzr vlva ozpb qmgb'  # сгенерированный пароль для приложений
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Очередь писем (logo_app.mailqueue): отправляет воркер manage.py send_queued_mail --loop
+MAIL_QUEUE_BATCH_SIZE = 50
+MAIL_QUEUE_MAX_ATTEMPTS = 6
+MAIL_QUEUE_RETRY_BASE = 30
+
+# Рассылка подписчикам (logo_app.newsletter): manage.py send_newsletter
+NEWSLETTER_THREADS = 4
+NEWSLETTER_CHUNK_SIZE = 100
+NEWSLETTER_CLAIM_TIMEOUT = 600  # секунд без чекпоинта, после которых захват запуска считается брошенным
+
+# Массовый импорт пользователей (logo_app.userimport): manage.py import_users, /user/import/
+# (задания выполняет воркер manage.py run_user_imports --loop)
+USER_IMPORT_BATCH_SIZE = 1000
+USER_IMPORT_WORKERS = None  # None — по числу ядер
+USER_IMPORT_TEMP_DIR = os.path.join(BASE_DIR, 'upload_tmp', 'user_import')
+
+# Отложенная запись сообщений чата (chat.buffer): пачка по размеру или по времени, секунд
+CHAT_FLUSH_SIZE = 100
+CHAT_FLUSH_INTERVAL = 1.0
+CHAT_HISTORY_PAGE_SIZE = 50  # сообщений на страницу истории (chat.history)
+